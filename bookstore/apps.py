@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class BookstoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookstore'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .cache import check_catalog_cache
+        from .instrumentation import install_query_recording
+        checks.register(check_catalog_cache, checks.Tags.caches)
+        connection_created.connect(install_query_recording)
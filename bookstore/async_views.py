@@ -0,0 +1,90 @@
+"""
+Async versions of the hot catalog read endpoints, served under
+`/api/catalog/` when the app runs under ASGI. They reuse BookViewSet's
+filtering, column selection, serializers and keyset pagination, so the
+responses match the DRF endpoints; only the query evaluation is awaited.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.exceptions import MethodNotAllowed, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .cache import cache_catalog_data
+from .exceptions import custom_exception_handler
+from .models import Author, Book, Genre
+from .serializers import BookSerializer
+from .views import BookViewSet
+
+
+def render(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+def catalog_endpoint(view_func):
+    """Read-only async view returning data; errors are shaped like DRF's"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method not in ('GET', 'HEAD'):
+                raise MethodNotAllowed(request.method)
+            data = await view_func(Request(request), *args, **kwargs)
+        except Exception as exc:
+            response = custom_exception_handler(exc, {})
+            if response is None:
+                raise
+            return render(response.data, response.status_code)
+        return render(data)
+    wrapper.use_read_replica = True
+    return wrapper
+
+def book_view(request, action, **kwargs):
+    """A BookViewSet bound to `request`, used for its queryset and serializer setup"""
+    view = BookViewSet(action=action, args=(), kwargs=kwargs, format_kwarg=None)
+    view.request = request
+    return view
+
+async def paginate(view, queryset):
+    # Filter backends may touch the database (the FTS table check), so
+    # the queryset is built in the sync thread and evaluated with async for
+    queryset = await sync_to_async(view.filter_queryset)(queryset)
+    paginator = view.paginator
+    page_queryset = paginator.get_page_queryset(queryset, view.request, view)
+    page = paginator.set_page([book async for book in page_queryset])
+    return paginator.get_paginated_data(view.get_serializer(page, many=True).data)
+
+@catalog_endpoint
+async def book_list(request):
+    view = book_view(request, 'list')
+    return await paginate(view, view.get_queryset())
+
+@catalog_endpoint
+async def book_detail(request, pk):
+    view = book_view(request, 'retrieve', pk=pk)
+    book = await view.get_queryset().filter(pk=pk).afirst()
+    if book is None:
+        raise NotFound()
+    return view.get_serializer(book).data
+
+@catalog_endpoint
+@cache_catalog_data('catalog.bestsellers', 'book')
+async def bestsellers(request):
+    view = book_view(request, 'bestsellers')
+    return await paginate(view, view.get_queryset().filter(best_seller=True))
+
+@catalog_endpoint
+@cache_catalog_data('catalog.genre_books', 'book', 'genre', 'bookgenre')
+async def genre_books(request, pk):
+    if not await Genre.objects.filter(pk=pk).aexists():
+        raise NotFound()
+    books = [book async for book in Book.objects.filter(bookgenre__genre_id=pk)]
+    return BookSerializer(books, many=True).data
+
+@catalog_endpoint
+@cache_catalog_data('catalog.author_books', 'book', 'author', 'bookauthor')
+async def author_books(request, pk):
+    if not await Author.objects.filter(pk=pk).aexists():
+        raise NotFound()
+    books = [book async for book in Book.objects.filter(bookauthor__author_id=pk)]
+    return BookSerializer(books, many=True).data
@@ -0,0 +1,105 @@
+from collections import Counter
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_generation
+from .models import Book
+from .ratings import refresh_rollups_for_books
+from .search import has_fts_table, index_book
+from .serializers import BookSerializer
+
+BATCH_LIMIT = 100
+# Columns the author and genre rollups are computed from
+ROLLUP_FIELDS = {'rating', 'amount_ratings', 'best_seller'}
+# Columns held in the SQLite FTS table
+SEARCH_FIELDS = {'title', 'description'}
+UNIQUE_FIELDS = [field.name for field in Book._meta.concrete_fields if field.unique and not field.primary_key]
+
+
+def parse_ids(value, limit=BATCH_LIMIT):
+    """`?ids=3,1,2` as a list of distinct ids in the order given"""
+    try:
+        ids = [int(part) for part in (value or '').split(',') if part.strip()]
+    except ValueError:
+        raise ValidationError({'ids': 'ids must be a comma-separated list of integers'})
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValidationError({'ids': 'ids is required'})
+    if len(ids) > limit:
+        raise ValidationError({'ids': f'at most {limit} ids per request'})
+    return ids
+
+def update_books(updates, limit=BATCH_LIMIT):
+    """
+    Apply partial updates `[{'id': ..., <field>: <value>, ...}, ...]` as
+    one transaction. The rows are locked and loaded in one query, each
+    update is validated by a partial BookSerializer, and every change is
+    written with a single `bulk_update`; any invalid entry rolls back the
+    lot. The serializer checks unique fields against the stored rows only,
+    so values repeated within the batch are rejected here. Returns the
+    updated books in request order.
+    """
+    if not isinstance(updates, list) or not updates:
+        raise ValidationError({'updates': 'expected a non-empty list of updates'})
+    if len(updates) > limit:
+        raise ValidationError({'updates': f'at most {limit} updates per request'})
+    try:
+        ids = [int(update['id']) for update in updates]
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError({'updates': 'each update needs an integer id'})
+    if len(set(ids)) != len(ids):
+        raise ValidationError({'updates': 'each book may appear only once'})
+
+    try:
+        with transaction.atomic():
+            updated, fields = apply_updates(ids, updates)
+    except IntegrityError:
+        # A concurrent write took one of the unique values first
+        raise ValidationError({'updates': 'a unique value is already taken by another book'})
+
+    bump_generation('book')
+    if fields & ROLLUP_FIELDS:
+        refresh_rollups_for_books(ids)
+    return updated
+
+def apply_updates(ids, updates):
+    books = Book.objects.select_for_update().in_bulk(ids)
+    errors, changes, fields = [], [], set()
+    for book_id, update in zip(ids, updates):
+        book = books.get(book_id)
+        if book is None:
+            errors.append({'id': ['book not found']})
+            changes.append({})
+            continue
+        serializer = BookSerializer(book, data=update, partial=True)
+        if not serializer.is_valid():
+            errors.append(serializer.errors)
+            changes.append({})
+            continue
+        errors.append({})
+        changes.append(serializer.validated_data)
+        for name, value in serializer.validated_data.items():
+            setattr(book, name, value)
+        fields.update(serializer.validated_data)
+    for name in fields.intersection(UNIQUE_FIELDS):
+        counts = Counter(change[name] for change in changes if name in change)
+        for error, change in zip(errors, changes):
+            if name in change and counts[change[name]] > 1:
+                error.setdefault(name, []).append(f'{name} is repeated within this batch')
+    if any(errors):
+        raise ValidationError({'updates': errors})
+
+    updated = [books[book_id] for book_id in ids]
+    now = timezone.now()
+    for book in updated:
+        book.version += 1
+        book.updated_at = now
+    Book.objects.bulk_update(updated, [*sorted(fields), 'version', 'updated_at'])
+
+    # bulk_update skips the post_save handlers, so do their work here
+    if fields & SEARCH_FIELDS and connection.vendor == 'sqlite' and has_fts_table(connection):
+        for book in updated:
+            index_book(connection, book)
+    return updated, fields
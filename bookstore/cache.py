@@ -0,0 +1,148 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .conditional import not_modified_response
+from .db_routers import read_from_primary
+from .metrics import CATALOG_CACHE_REQUESTS
+
+def get_catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+def catalog_cache_is_shared():
+    """
+    Whether every worker sees the same catalog cache. Generation bumps
+    in a process-local cache only invalidate the writer's own process.
+    """
+    return not isinstance(get_catalog_cache(), (LocMemCache, FileBasedCache, DummyCache))
+
+def check_catalog_cache(app_configs, **kwargs):
+    if settings.DEBUG or catalog_cache_is_shared():
+        return []
+    return [checks.Warning(
+        'The catalog cache is local to each process, so a write only '
+        'invalidates cached catalog responses in the process that made it.',
+        hint='Set REDIS_URL when running more than one worker.',
+        id='bookstore.W001',
+    )]
+
+def generation_key(model_name):
+    return f'catalog:gen:{model_name}'
+
+def get_generations(model_names):
+    """
+    Current generation counter for each model. Missing counters are seeded
+    from the clock rather than zero, so an evicted counter can never fall
+    back onto a generation that older cached responses were keyed with.
+    """
+    cache = get_catalog_cache()
+    keys = [generation_key(name) for name in model_names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+async def aget_generations(model_names):
+    cache = get_catalog_cache()
+    keys = [generation_key(name) for name in model_names]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+def bump_generation(*model_names):
+    """
+    Invalidate every cached response that depends on these models once
+    the current transaction commits. Bumping earlier would let a read in
+    between cache pre-commit rows under the new generation.
+    """
+    transaction.on_commit(lambda: bump_generation_now(model_names))
+
+def bump_generation_now(model_names):
+    cache = get_catalog_cache()
+    for name in model_names:
+        key = generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+def catalog_cache_key(endpoint, request, model_names, view_kwargs):
+    return format_cache_key(endpoint, request, get_generations(model_names), view_kwargs)
+
+async def acatalog_cache_key(endpoint, request, model_names, view_kwargs):
+    return format_cache_key(endpoint, request, await aget_generations(model_names), view_kwargs)
+
+def format_cache_key(endpoint, request, generations, view_kwargs):
+    generations = ':'.join(str(g) for g in generations)
+    query = sorted(request.query_params.lists())
+    raw = f'{request.get_host()}|{sorted(view_kwargs.items())}|{query}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'catalog:{endpoint}:{generations}:{digest}'
+
+def cache_catalog_response(*model_names, timeout=None):
+    """
+    Read-through cache for a viewset action. Responses are keyed by
+    endpoint, query string and the generation of every model the action
+    reads, so a write to any of those models makes old entries unreachable.
+    The view's conditional-GET validators are cached with the data, so a
+    hit can still be answered with a 304. Misses read from the primary.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_catalog_cache()
+            endpoint = f'{self.basename}.{view_method.__name__}'
+            key = catalog_cache_key(endpoint, request, model_names, kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                CATALOG_CACHE_REQUESTS.labels(endpoint, 'hit').inc()
+                data, self.validators = entry
+                if self.validators is not None:
+                    response = not_modified_response(request, self.validators)
+                    if response is not None:
+                        return response
+                return Response(data)
+            CATALOG_CACHE_REQUESTS.labels(endpoint, 'miss').inc()
+            with read_from_primary():
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                ttl = settings.CATALOG_CACHE_TIMEOUT if timeout is None else timeout
+                cache.set(key, (response.data, getattr(self, 'validators', None)), ttl)
+            return response
+        return wrapper
+    return decorator
+
+def cache_catalog_data(endpoint, *model_names, timeout=None):
+    """
+    Async counterpart of `cache_catalog_response` for the views in
+    `async_views`, which return plain data rather than a Response.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            cache = get_catalog_cache()
+            key = await acatalog_cache_key(endpoint, request, model_names, kwargs)
+            data = await cache.aget(key)
+            CATALOG_CACHE_REQUESTS.labels(endpoint, 'miss' if data is None else 'hit').inc()
+            if data is None:
+                with read_from_primary():
+                    data = await view_func(request, *args, **kwargs)
+                ttl = settings.CATALOG_CACHE_TIMEOUT if timeout is None else timeout
+                await cache.aset(key, data, ttl)
+            return data
+        return wrapper
+    return decorator
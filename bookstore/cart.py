@@ -0,0 +1,46 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import Book, CartProduct, ShoppingCart, version_bump
+
+
+def upsert_cart_items(cart, items):
+    """
+    Add `(book_id, format, quantity)` lines to `cart` with a single
+    `INSERT ... SELECT ... ON CONFLICT DO UPDATE` statement, so concurrent
+    adds of the same line accumulate instead of racing on the unique key.
+    The SELECT joins against books, dropping unknown ids and formats the
+    book is not sold in; if any line was dropped the whole call rolls back.
+    """
+    merged = defaultdict(int)
+    for book_id, book_format, quantity in items:
+        merged[(book_id, book_format)] += quantity
+    if not merged:
+        return 0
+
+    table = CartProduct._meta.db_table
+    book_table = Book._meta.db_table
+    values = ', '.join(['(%s, %s, %s)'] * len(merged))
+    params = [cart.pk]
+    for (book_id, book_format), quantity in merged.items():
+        params += [book_id, book_format, quantity]
+    sql = f"""
+        INSERT INTO {table} (cart_id, book_id, format, quantity)
+        SELECT %s, book.id, line.column2, line.column3
+        FROM (VALUES {values}) AS line
+        JOIN {book_table} AS book ON book.id = line.column1
+        WHERE (line.column2 <> 'ebook' OR book.ebook)
+          AND (line.column2 <> 'audiobook' OR book.audiobook)
+        ON CONFLICT (cart_id, book_id, format)
+        DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            written = cursor.rowcount
+        if written != len(merged):
+            raise ValidationError({'error': 'book not found or not available in that format'})
+        ShoppingCart.objects.filter(pk=cart.pk).update(**version_bump())
+    return written
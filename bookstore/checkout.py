@@ -0,0 +1,93 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+
+from .exceptions import OutOfStockException
+from .models import Book, CartProduct, OrderProduct, ShoppingOrder, version_bump
+
+FORMATS = {choice for choice, _ in CartProduct.FORMAT_CHOICES}
+# Digital formats are not drawn from warehouse stock
+STOCKED_FORMATS = {'hardcover', 'paperback'}
+
+
+def checkout_lines(items):
+    """Validate `CheckoutOrder.items` into a `{(book_id, format): quantity}` map"""
+    lines = defaultdict(int)
+    try:
+        for item in items:
+            book_id = int(item['book_id'])
+            quantity = int(item.get('quantity', 1))
+            book_format = item.get('format', 'hardcover')
+            if quantity < 1 or book_format not in FORMATS:
+                raise ValueError
+            lines[(book_id, book_format)] += quantity
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError({'items': 'each item needs a book_id, a positive quantity and a valid format'})
+    if not lines:
+        raise ValidationError({'items': 'checkout has no items'})
+    return lines
+
+def to_cents(amount):
+    return int((amount * 100).quantize(Decimal('1')))
+
+def place_order(checkout, shipping_amount=0, taxes_amount=0):
+    """
+    Turn a CheckoutOrder into a ShoppingOrder in one transaction.
+
+    Stock is taken with one conditional `UPDATE ... SET stock = stock - n
+    WHERE stock >= n` per book, in ascending id order so concurrent
+    checkouts lock rows in the same order and cannot deadlock. The first
+    update that matches no row means another checkout got there first:
+    OutOfStockException is raised and everything rolls back. Amounts are
+    stored in cents.
+    """
+    lines = checkout_lines(checkout.items)
+    stocked = defaultdict(int)
+    for (book_id, book_format), quantity in lines.items():
+        if book_format in STOCKED_FORMATS:
+            stocked[book_id] += quantity
+
+    book_ids = {book_id for book_id, _ in lines}
+    with transaction.atomic():
+        # Checked before taking stock, so an unknown id is reported as
+        # such rather than as out of stock
+        books = Book.objects.only(
+            'price_hardcover', 'price_paperback', 'price_ebook', 'price_audiobook'
+        ).in_bulk(book_ids)
+        missing = book_ids - books.keys()
+        if missing:
+            raise ValidationError({'items': f'unknown books: {sorted(missing)}'})
+
+        for book_id in sorted(stocked):
+            taken = Book.objects.filter(pk=book_id, stock__gte=stocked[book_id]).update(
+                stock=F('stock') - stocked[book_id], **version_bump()
+            )
+            if not taken:
+                raise OutOfStockException(f'Book {book_id} does not have enough stock.')
+
+        order_amount = sum(
+            getattr(books[book_id], f'price_{book_format}') * quantity
+            for (book_id, book_format), quantity in lines.items()
+        )
+
+        order = ShoppingOrder.objects.create(
+            user=checkout.user,
+            user_name=checkout.user_name,
+            email=checkout.email,
+            address=checkout.address,
+            phone=checkout.phone,
+            shipping_method=checkout.shipping_method,
+            shipping_amount=shipping_amount,
+            order_amount=to_cents(order_amount),
+            taxes_amount=taxes_amount,
+            order_status='pending',
+        )
+        OrderProduct.objects.bulk_create([
+            OrderProduct(order=order, book_id=book_id, quantity=quantity, version=book_format)
+            for (book_id, book_format), quantity in lines.items()
+        ])
+        checkout.delete()
+    return order
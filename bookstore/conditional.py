@@ -0,0 +1,93 @@
+"""
+HTTP validators for the catalog and cart representations. Versioned rows
+carry a `version` counter and `updated_at`; a representation's weak ETag
+hashes the `(id, version)` of every row it is built from together with
+the request parameters that shape it, and Last-Modified is the newest
+`updated_at`. Requests whose `If-None-Match` / `If-Modified-Since` still
+match get a 304 before anything is serialized.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def representation_validators(request, rows, *extra):
+    """`(etag, last_modified)` for a representation of `rows`; last_modified is a timestamp or None"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    raw = repr((
+        getattr(renderer, 'format', None),
+        sorted(request.query_params.lists()),
+        extra,
+        [(row.id, row.version) for row in rows],
+    ))
+    etag = f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+    modified = [row.updated_at for row in rows if row.updated_at is not None]
+    last_modified = int(max(modified).timestamp()) if modified else None
+    return etag, last_modified
+
+def validator_headers(validators):
+    etag, last_modified = validators
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+def not_modified_response(request, validators):
+    """A 304 carrying the validators if the client's copy is current, else None"""
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        for header, value in validator_headers(validators).items():
+            response[header] = value
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    For viewsets over versioned models. `list` and `retrieve` check the
+    request's preconditions against the rows they are about to serialize;
+    other actions do the same through `conditional_response`. Successful
+    responses carry the ETag and Last-Modified headers.
+    """
+    validators = None
+
+    def validator_rows(self, instance):
+        """Rows whose versions determine `instance`'s detail representation"""
+        return [instance]
+
+    def conditional_response(self, rows, build_response, *extra):
+        """
+        Record validators for `rows`, then answer 304 if they still match
+        the request, otherwise call `build_response()`
+        """
+        self.validators = representation_validators(self.request, rows, *extra)
+        response = not_modified_response(self.request, self.validators)
+        if response is not None:
+            return response
+        return build_response()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.validators is not None and response.status_code == 200:
+            for header, value in validator_headers(self.validators).items():
+                response.setdefault(header, value)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response(
+            self.validator_rows(instance), lambda: Response(self.get_serializer(instance).data)
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.conditional_response(
+                page, lambda: self.get_paginated_response(self.get_serializer(page, many=True).data),
+                getattr(self.paginator, 'has_next', None),
+            )
+        rows = list(queryset)
+        return self.conditional_response(rows, lambda: Response(self.get_serializer(rows, many=True).data))
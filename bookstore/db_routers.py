@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+REPLICA_ALIAS = 'replica'
+
+# Set per request by ReadReplicaMiddleware
+use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Route the block's reads to the primary. Used for reads that fill a
+    shared cache: the generation they are keyed by is bumped on the
+    primary's commit, so a lagging replica would store pre-commit rows
+    under the new generation.
+    """
+    token = use_replica.set(False)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads to the replica while a request handled by a view with
+    `use_read_replica = True` is a GET/HEAD. Everything else, including
+    all writes and migrations, stays on the primary, as do reads inside
+    `read_from_primary()`.
+    """
+
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if use_replica.get() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,59 @@
+from django.db.models import Case, CharField, Count, F, Value, When
+
+from .models import BookGenre
+
+# (label, min, max) over price_hardcover; max is exclusive, None is open
+PRICE_BANDS = [
+    ('under-10', None, 10),
+    ('10-20', 10, 20),
+    ('20-30', 20, 30),
+    ('30-50', 30, 50),
+    ('50-plus', 50, None),
+]
+VALUE_FACETS = ('publisher', 'type')
+FLAG_FACETS = ('best_seller', 'on_offer', 'ebook', 'audiobook')
+FACET_LIMIT = 50
+
+
+def price_band():
+    whens = [
+        When(price_hardcover__lt=high, then=Value(label))
+        for label, _, high in PRICE_BANDS if high is not None
+    ]
+    return Case(*whens, default=Value(PRICE_BANDS[-1][0]), output_field=CharField())
+
+def grouped(queryset, facet, value):
+    return queryset.order_by().annotate(
+        facet=Value(facet, output_field=CharField()), value=value,
+    ).values('facet', 'value').annotate(count=Count('id'))
+
+def facet_counts(books):
+    """
+    Counts per publisher, type, genre, price band and flag for the books
+    matched by `books`, fetched as one UNION ALL of grouped queries.
+    """
+    book_ids = books.order_by().values('pk')
+    parts = [grouped(books, name, F(name)) for name in VALUE_FACETS]
+    parts.append(grouped(BookGenre.objects.filter(book__in=book_ids), 'genre', F('genre__genre_name')))
+    parts.append(grouped(books, 'price_band', price_band()))
+    parts += [
+        grouped(books.filter(**{flag: True}), flag, Value('true', output_field=CharField()))
+        for flag in FLAG_FACETS
+    ]
+    rows = parts[0].union(*parts[1:], all=True)
+
+    counts = {}
+    for row in rows:
+        counts.setdefault(row['facet'], {})[row['value']] = row['count']
+
+    facets = {}
+    for name in VALUE_FACETS + ('genre',):
+        values = sorted(counts.get(name, {}).items(), key=lambda item: (-item[1], item[0]))
+        facets[name] = [{'value': value, 'count': count} for value, count in values[:FACET_LIMIT]]
+    bands = counts.get('price_band', {})
+    facets['price_band'] = [
+        {'value': label, 'min': low, 'max': high, 'count': bands.get(label, 0)}
+        for label, low, high in PRICE_BANDS
+    ]
+    facets['flags'] = {flag: counts.get(flag, {}).get('true', 0) for flag in FLAG_FACETS}
+    return facets
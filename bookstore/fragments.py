@@ -0,0 +1,104 @@
+"""
+Per-book JSON fragments for the catalog list representation. Each book's
+serialized dict is encoded once and cached, and list responses are
+stitched together from the cached bytes instead of running the serializer
+field by field for every row. Fragments are keyed by the book's `version`,
+so a write makes the old fragment unreachable in every worker without any
+invalidation; stale ones simply expire. Only the default field set is
+cached; `?fields=`/`?omit=` requests serialize normally.
+"""
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_catalog_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+def loads(fragment):
+    if orjson is not None:
+        return orjson.loads(fragment)
+    return json.loads(fragment)
+
+
+class PreRenderedList(Sequence):
+    """
+    Already-encoded JSON items. FragmentJSONRenderer writes the fragments
+    out verbatim; anything else (tests, the browsable API) sees the items
+    decoded on access.
+    """
+
+    def __init__(self, fragments):
+        self.fragments = list(fragments)
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [loads(fragment) for fragment in self.fragments[index]]
+        return loads(self.fragments[index])
+
+    def __eq__(self, other):
+        return list(self) == other
+
+
+def fragment_key(serializer_class, book_id, version):
+    return f'catalog:fragment:{serializer_class.__name__}:{book_id}:{version}'
+
+def fragments_apply(request, serializer_class):
+    params = (serializer_class.fields_query_param, serializer_class.omit_query_param)
+    return not any(request.query_params.get(param) for param in params)
+
+def render_fragments(books, serializer_class, context):
+    """
+    Encoded fragments for `books` in order; each book must have its
+    `version` loaded. Cached fragments are fetched in one round trip; the
+    misses are serialized together and stored.
+    """
+    books = list(books)
+    cache = get_catalog_cache()
+    keys = [fragment_key(serializer_class, book.id, book.version) for book in books]
+    found = cache.get_many(keys)
+    missing = [(book, key) for book, key in zip(books, keys) if key not in found]
+    if missing:
+        data = serializer_class([book for book, _ in missing], many=True, context=context).data
+        rendered = {key: dumps(item) for (_, key), item in zip(missing, data)}
+        cache.set_many(rendered, settings.CATALOG_FRAGMENT_TIMEOUT)
+        found.update(rendered)
+    return PreRenderedList(found[key] for key in keys)
+
+class FragmentJSONRenderer(JSONRenderer):
+    """JSONRenderer that splices PreRenderedList values in as raw JSON arrays"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not self.has_fragments(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        return self.stitch(data)
+
+    def has_fragments(self, data):
+        if isinstance(data, dict):
+            return any(isinstance(value, PreRenderedList) for value in data.values())
+        return isinstance(data, PreRenderedList)
+
+    def stitch(self, value):
+        if isinstance(value, PreRenderedList):
+            return b'[' + b','.join(value.fragments) + b']'
+        if isinstance(value, dict) and self.has_fragments(value):
+            return b'{' + b','.join(
+                dumps(key) + b':' + self.stitch(item) for key, item in value.items()
+            ) + b'}'
+        if value is None:
+            return b'null'
+        return super().render(value)
@@ -0,0 +1,233 @@
+import csv
+import json
+import os
+
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+
+from .cache import bump_generation
+from .models import Author, Book, BookAuthor, BookGenre, Genre, version_bump
+from .ratings import refresh_rollups
+from .search import has_fts_table, reindex_all, reindex_books
+from .similarity import rebuild_all as rebuild_similarity, rebuild_for_book
+
+FORMATS = ('csv', 'jsonl')
+LIST_SEPARATOR = '|'
+# Rejected rows kept for the report; the rest are only counted
+MAX_ERRORS = 100
+# Feeds may set any editable column; the row version is managed here
+BOOK_FIELDS = {
+    field.name: field for field in Book._meta.concrete_fields
+    if field.editable and not field.primary_key and field.name != 'version'
+}
+# Columns a feed may leave out; everything else without a model default
+# is required
+IMPORT_DEFAULTS = {
+    'rating': 0.0,
+    'amount_ratings': 0,
+    'one_rating': 0,
+    'two_rating': 0,
+    'three_rating': 0,
+    'four_rating': 0,
+    'five_rating': 0,
+    'stock': 0,
+}
+TRUE_VALUES = {'1', 't', 'true', 'y', 'yes'}
+
+
+def detect_format(filename, default='csv'):
+    extension = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    return default
+
+def read_records(stream, input_format):
+    """
+    Yields one record per input row without reading the whole stream: the
+    raw line for JSONL, a dict for CSV. Lines are parsed by `parse_record`
+    so a malformed one is rejected on its own rather than ending the import.
+    Streams should be opened with errors='surrogateescape' for the same
+    reason.
+    """
+    if input_format == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield line
+    else:
+        yield from csv.DictReader(stream)
+
+def parse_record(record):
+    """A row from `read_records` as a dict of column -> value"""
+    if isinstance(record, str):
+        record = json.loads(check_utf8(record))
+    elif isinstance(record, dict):
+        for value in record.values():
+            if isinstance(value, str):
+                check_utf8(value)
+    if not isinstance(record, dict):
+        raise ValueError('each row must be an object')
+    return record
+
+def check_utf8(text):
+    # Undecodable input bytes arrive as lone surrogates (surrogateescape)
+    try:
+        text.encode('utf-8')
+    except UnicodeEncodeError:
+        raise ValueError('row is not valid UTF-8')
+    return text
+
+def split_names(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    return [name.strip() for name in value if name and name.strip()]
+
+
+class CatalogImporter:
+    """
+    Loads books in batches with one upsert per batch, keyed on the unique
+    title. Authors and genres are resolved through in-memory name->id maps
+    and created in bulk when missing; links are inserted ignoring
+    duplicates. Only the current batch is held in memory.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.author_ids = dict(Author.objects.values_list('name', 'id'))
+        self.genre_ids = dict(Genre.objects.values_list('genre_name', 'id'))
+        self.touched_books = set()
+        self.touched_authors = set()
+        self.touched_genres = set()
+        self.stats = {'books': 0, 'authors_created': 0, 'genres_created': 0, 'rejected': 0, 'errors': []}
+
+    def run(self, records):
+        batch = {}
+        for line, record in enumerate(records, start=1):
+            try:
+                title, fields, authors, genres = self.clean(record)
+            except (ValidationError, ValueError, TypeError) as exc:
+                self.stats['rejected'] += 1
+                if len(self.stats['errors']) < MAX_ERRORS:
+                    self.stats['errors'].append({'row': line, 'error': str(exc)})
+                continue
+            # A repeated title inside one batch would hit the same row twice
+            # in a single upsert, so the last occurrence wins
+            batch[title] = (fields, authors, genres)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = {}
+        if batch:
+            self.write_batch(batch)
+        return self.stats
+
+    def clean(self, record):
+        record = parse_record(record)
+        fields = {}
+        for name, value in record.items():
+            field = BOOK_FIELDS.get(name)
+            if field is None:
+                continue
+            if value in ('', None):
+                if not field.null:
+                    continue
+                value = None
+            elif isinstance(field, models.BooleanField) and isinstance(value, str):
+                value = value.strip().lower() in TRUE_VALUES
+            else:
+                # clean() also applies max_length and the column's range,
+                # which the database would otherwise reject for the batch
+                try:
+                    value = field.clean(value, None)
+                except ValidationError as exc:
+                    raise ValidationError({name: exc.messages})
+            fields[name] = value
+        title = fields.get('title')
+        if not title:
+            raise ValueError('title is required')
+        missing = [
+            name for name, field in BOOK_FIELDS.items()
+            if name not in fields and name not in IMPORT_DEFAULTS
+            and not field.null and not field.has_default()
+        ]
+        if missing:
+            raise ValueError(f'missing required fields: {", ".join(sorted(missing))}')
+        return title, fields, split_names(record.get('authors')), split_names(record.get('genres'))
+
+    def resolve(self, model, name_field, known, names, stat):
+        missing = set(names) - known.keys()
+        if not missing:
+            return
+        model.objects.bulk_create(
+            [model(**{name_field: name}) for name in missing], ignore_conflicts=True
+        )
+        created = dict(model.objects.filter(**{f'{name_field}__in': missing}).values_list(name_field, 'id'))
+        known.update(created)
+        self.stats[stat] += len(created)
+
+    def write_batch(self, batch):
+        self.resolve(Author, 'name', self.author_ids,
+                     {name for _, authors, _ in batch.values() for name in authors}, 'authors_created')
+        self.resolve(Genre, 'genre_name', self.genre_ids,
+                     {name for _, _, genres in batch.values() for name in genres}, 'genres_created')
+
+        # Only columns every row in the batch supplied are overwritten on
+        # conflict; the rest keep their stored values
+        supplied = set.intersection(*(set(fields) for fields, _, _ in batch.values()))
+        update_fields = sorted(supplied - {'title'})
+        books = [
+            Book(**{**IMPORT_DEFAULTS, **fields}) for fields, _, _ in batch.values()
+        ]
+
+        with transaction.atomic():
+            Book.objects.bulk_create(
+                books, update_conflicts=bool(update_fields), ignore_conflicts=not update_fields,
+                unique_fields=['title'], update_fields=update_fields or None,
+            )
+            book_ids = dict(Book.objects.filter(title__in=batch.keys()).values_list('title', 'id'))
+            # The upsert cannot express version + 1, so bump the batch after it
+            Book.objects.filter(id__in=book_ids.values()).update(**version_bump())
+            author_links = [
+                BookAuthor(book_id=book_ids[title], author_id=self.author_ids[name])
+                for title, (_, authors, _) in batch.items() for name in authors
+            ]
+            genre_links = [
+                BookGenre(book_id=book_ids[title], genre_id=self.genre_ids[name])
+                for title, (_, _, genres) in batch.items() for name in genres
+            ]
+            BookAuthor.objects.bulk_create(author_links, ignore_conflicts=True)
+            BookGenre.objects.bulk_create(genre_links, ignore_conflicts=True)
+            Author.objects.filter(id__in={link.author_id for link in author_links}).update(**version_bump())
+            Genre.objects.filter(id__in={link.genre_id for link in genre_links}).update(**version_bump())
+
+        self.touched_books.update(book_ids.values())
+        self.touched_authors.update(link.author_id for link in author_links)
+        self.touched_genres.update(link.genre_id for link in genre_links)
+        self.stats['books'] += len(books)
+
+    def refresh_derived(self, similarity=True, incremental=False):
+        """
+        Bulk writes skip model signals, so bring the caches, search index,
+        rating rollups and (optionally) the similarity table up to date
+        once at the end instead of per row. `incremental` refreshes only
+        the imported books' search rows and neighbours, which keeps a
+        small upload cheap; a full rebuild suits large offline imports.
+        """
+        bump_generation('book', 'author', 'genre', 'bookauthor', 'bookgenre')
+        if connection.vendor == 'sqlite' and has_fts_table(connection):
+            if incremental:
+                reindex_books(connection, sorted(self.touched_books))
+            else:
+                reindex_all(connection)
+        authors = sorted(self.touched_authors)
+        for start in range(0, len(authors), self.batch_size):
+            refresh_rollups(authors[start:start + self.batch_size], self.touched_genres)
+        if not similarity or not (self.touched_authors or self.touched_genres):
+            return
+        if incremental:
+            for book_id in sorted(self.touched_books):
+                rebuild_for_book(book_id)
+        else:
+            rebuild_similarity()
@@ -0,0 +1,195 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('bookstore.queries')
+
+# A query shape seen this many times in one request is reported as N+1
+REPEAT_THRESHOLD = 3
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+VALUE_LISTS = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+
+# The recorder of the request being handled. A context variable rather than
+# a wrapper installed per request, because under ASGI the ORM runs in
+# sync_to_async threads, each with its own connections; they inherit the
+# context but not the event loop thread's connection objects.
+active_recorder = ContextVar('active_recorder', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """The query with literals and IN-lists collapsed, so N+1 loops group together"""
+    return VALUE_LISTS.sub('(...)', LITERALS.sub('?', sql))
+
+
+class QueryRecorder:
+    """`execute_wrapper` hook counting and timing every query it sees"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+    def describe(self, budget=None):
+        lines = [f'{self.count} queries in {self.duration * 1000:.1f}ms']
+        if budget is not None:
+            lines[0] += f' (budget {budget})'
+        lines += [f'  {count}x {sql}' for sql, count in self.repeated(threshold=2)]
+        return '\n'.join(lines)
+
+    @contextmanager
+    def installed(self, aliases=None):
+        with ExitStack() as stack:
+            for alias in aliases or connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+
+def record_queries(execute, sql, params, many, context):
+    """`execute_wrapper` installed on every connection; reports to the active recorder, if any"""
+    recorder = active_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+def install_query_recording(sender, connection, **kwargs):
+    """`connection_created` handler adding `record_queries` to each new connection"""
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+@contextmanager
+def query_budget(limit, aliases=None):
+    """
+    Test helper: fails the block if it runs more than `limit` queries,
+    listing the repeated query shapes in the failure message.
+    """
+    recorder = QueryRecorder()
+    with recorder.installed(aliases):
+        yield recorder
+    if recorder.count > limit:
+        raise QueryBudgetExceeded(recorder.describe(limit))
+
+
+def view_action(view_func, method):
+    """`(viewset_name, action)` for a router view, or the plain view's name"""
+    view = getattr(view_func, 'cls', None)
+    if view is None:
+        return getattr(view_func, '__name__', 'unknown'), method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return view.__name__, actions.get(method.lower(), method.lower())
+
+def get_query_budget(view_func, method):
+    """The budget a viewset declares for the action behind this view, if any"""
+    view = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    if view is None or action is None:
+        return None
+    return getattr(view, 'query_budgets', {}).get(action)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records latency, query count, SQL time and repeated query shapes per
+    request. They are exported as Prometheus metrics labelled by route
+    name (and viewset action for latency), and in a `Server-Timing`
+    header when DEBUG is on or the user is staff. Viewsets may declare
+    `query_budgets = {action: max_queries}`; going over logs a warning,
+    or raises when the QUERY_BUDGET_ENFORCE setting is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        token = active_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            active_recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        token = active_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            active_recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func, request.method)
+        request.view_action = view_action(view_func, request.method)
+
+    def finish(self, request, response, recorder, elapsed):
+        route = route_name(request)
+        if shows_timing(request):
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+        viewset, action = getattr(request, 'view_action', ('unresolved', request.method.lower()))
+        metrics.REQUEST_LATENCY.labels(route, viewset, action).observe(elapsed)
+        metrics.REQUEST_QUERIES.labels(route).observe(recorder.count)
+        metrics.REQUEST_DB_SECONDS.labels(route).observe(recorder.duration)
+
+        if recorder.repeated():
+            metrics.REPEATED_QUERY_REQUESTS.labels(route).inc()
+            logger.warning('Repeated queries on %s\n%s', route, recorder.describe())
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and recorder.count > budget:
+            metrics.QUERY_BUDGET_EXCEEDED.labels(route).inc()
+            message = f'Query budget exceeded on {route}: {recorder.describe(budget)}'
+            if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def shows_timing(request):
+    """Query counts and timings are only exposed to developers and staff"""
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or 'unnamed'
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bookstore.orders import rebuild_order_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily order and status rollups from the order table'
+
+    def handle(self, *args, **options):
+        days = rebuild_order_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt order rollups for {days} days'))
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookstore.importer import FORMATS, CatalogImporter, detect_format, read_records
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL catalog feed into the database in batched upserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-similarity', action='store_true',
+                            help='Leave the similar-books table for a later rebuild_similar_books')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or detect_format(path)
+        importer = CatalogImporter(batch_size=options['batch_size'])
+        try:
+            if path == '-':
+                stream = sys.stdin
+                stream.reconfigure(errors='surrogateescape')
+            else:
+                stream = open(path, newline='', encoding='utf-8', errors='surrogateescape')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            stats = importer.run(read_records(stream, input_format))
+        importer.refresh_derived(similarity=not options['skip_similarity'])
+
+        for error in stats['errors'][:20]:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['books']} books "
+            f"({stats['authors_created']} new authors, {stats['genres_created']} new genres, "
+            f"{stats['rejected']} rejected rows)"
+        ))
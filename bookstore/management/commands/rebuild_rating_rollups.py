@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bookstore.ratings import rebuild_all_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-author and per-genre rating rollups from book rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_all_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups for {count} authors'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bookstore.similarity import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed similar-books table from genre and author links'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt neighbours for {count} books'))
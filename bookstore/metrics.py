@@ -0,0 +1,38 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUEST_LATENCY = Histogram(
+    'bookstore_request_latency_seconds', 'Request latency by route and viewset action',
+    ['route', 'viewset', 'action'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'bookstore_request_db_queries', 'Database queries issued per request',
+    ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    'bookstore_request_db_seconds', 'Time spent in SQL per request', ['route'],
+)
+REPEATED_QUERY_REQUESTS = Counter(
+    'bookstore_repeated_query_requests_total',
+    'Requests that ran the same query shape often enough to look like N+1', ['route'],
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    'bookstore_query_budget_exceeded_total',
+    'Requests that ran more queries than their action allows', ['route'],
+)
+CATALOG_CACHE_REQUESTS = Counter(
+    'bookstore_catalog_cache_requests_total', 'Catalog response cache lookups',
+    ['endpoint', 'result'],
+)
+SERIALIZER_SECONDS = Histogram(
+    'bookstore_serializer_seconds', 'Time spent building serializer output',
+    ['serializer'], buckets=LATENCY_BUCKETS,
+)
+CATALOG_SNAPSHOT_BYTES = Gauge(
+    'bookstore_catalog_snapshot_bytes', 'Approximate memory held by the in-process catalog snapshot',
+)
+CATALOG_SNAPSHOT_BOOKS = Gauge(
+    'bookstore_catalog_snapshot_books', 'Books in the in-process catalog snapshot',
+)
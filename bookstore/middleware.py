@@ -0,0 +1,123 @@
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+
+from .cache import get_catalog_cache
+from .db_routers import use_replica
+
+SAFE_METHODS = ('GET', 'HEAD')
+HEALTH_PATH = '/api/health/'
+READY_PATH = '/api/ready/'
+READINESS_CACHE_KEY = 'health:ready'
+
+
+class ReadReplicaMiddleware:
+    """
+    Flags safe requests to views marked `use_read_replica` so the router
+    reads from the replica. The flag is reset before the response leaves,
+    so streamed bodies and the next request on this thread use the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = use_replica.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+    async def __acall__(self, request):
+        token = use_replica.set(False)
+        try:
+            return await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', view_func)
+        if request.method in SAFE_METHODS and getattr(view, 'use_read_replica', False):
+            use_replica.set(True)
+
+
+class HealthCheckMiddleware:
+    """
+    Answers the k8s probes before any other middleware runs: no session,
+    auth, DRF or metrics. Liveness only proves the process serves
+    requests. Readiness checks the primary database and the catalog
+    cache; the replica is left out so its outage cannot take every pod
+    out of service while the primary still serves. The result is
+    reused for READINESS_CHECK_INTERVAL seconds so frequent
+    probes do not each open connections.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.result = None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path == HEALTH_PATH:
+            return JsonResponse({'status': 'ok'})
+        if request.path == READY_PATH:
+            return self.readiness_response(self.readiness())
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path == HEALTH_PATH:
+            return JsonResponse({'status': 'ok'})
+        if request.path == READY_PATH:
+            return self.readiness_response(await sync_to_async(self.readiness)())
+        return await self.get_response(request)
+
+    def readiness(self):
+        interval = getattr(settings, 'READINESS_CHECK_INTERVAL', 5)
+        with self.lock:
+            now = time.monotonic()
+            if self.checked_at is None or now - self.checked_at >= interval:
+                self.result = self.run_checks()
+                self.checked_at = now
+            return self.result
+
+    def run_checks(self):
+        checks = {}
+        try:
+            with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            checks['database'] = 'ok'
+        except Exception as exc:
+            checks['database'] = f'error: {exc.__class__.__name__}'
+        try:
+            cache = get_catalog_cache()
+            cache.set(READINESS_CACHE_KEY, 1, 30)
+            if cache.get(READINESS_CACHE_KEY) != 1:
+                raise ValueError('cache read back failed')
+            checks['cache'] = 'ok'
+        except Exception as exc:
+            checks['cache'] = f'error: {exc.__class__.__name__}'
+        return checks
+
+    def readiness_response(self, checks):
+        ready = all(result == 'ok' for result in checks.values())
+        return JsonResponse(
+            {'status': 'ok' if ready else 'unavailable', 'checks': checks},
+            status=200 if ready else 503,
+        )
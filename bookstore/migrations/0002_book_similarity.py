@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookstore', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='bookstore.book')),
+                ('similar_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='bookstore.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-score'], name='book_similarity_rank_idx')],
+                'unique_together': {('book', 'similar_book')},
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE bookstore_book ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX book_search_vector_idx ON bookstore_book USING gin (search_vector)',
+]
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS book_search_vector_idx',
+    'ALTER TABLE bookstore_book DROP COLUMN IF EXISTS search_vector',
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE bookstore_book_fts USING fts5(title, description, tokenize='porter unicode61')",
+    "INSERT INTO bookstore_book_fts (rowid, title, description) "
+    "SELECT id, title, COALESCE(description, '') FROM bookstore_book",
+]
+SQLITE_REVERSE = [
+    'DROP TABLE IF EXISTS bookstore_book_fts',
+]
+
+
+def sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor == 'postgresql':
+            statements = postgres
+        elif connection.vendor == 'sqlite' and sqlite_has_fts5(connection):
+            statements = sqlite
+        else:
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookstore', '0002_book_similarity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn13'], name='book_isbn13_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        # Postgres keeps the generated tsvector current on every write; the
+        # SQLite FTS5 table is kept in sync from Book post_save/post_delete
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_REVERSE, SQLITE_REVERSE),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:45
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_rollups(apps, schema_editor):
+    """
+    Same totals as `rebuild_rating_rollups`, computed with the historical
+    models so the new tables are populated on deploy: one AuthorStats row
+    per author and one GenreAuthorStats row per linked (genre, author).
+    """
+    db_alias = schema_editor.connection.alias
+    Author = apps.get_model('bookstore', 'Author')
+    BookAuthor = apps.get_model('bookstore', 'BookAuthor')
+    Book = apps.get_model('bookstore', 'Book')
+    AuthorStats = apps.get_model('bookstore', 'AuthorStats')
+    GenreAuthorStats = apps.get_model('bookstore', 'GenreAuthorStats')
+
+    totals = {
+        row['author']: row for row in
+        BookAuthor.objects.using(db_alias).values('author').annotate(
+            book_count=Count('book'),
+            bestseller_count=Count('book', filter=Q(book__best_seller=True)),
+            rating_total=Sum('book__rating'),
+            ratings_count=Sum('book__amount_ratings'),
+        )
+    }
+    author_ids = Author.objects.using(db_alias).values_list('id', flat=True).iterator()
+    AuthorStats.objects.using(db_alias).bulk_create((
+        AuthorStats(
+            author_id=author_id,
+            book_count=totals.get(author_id, {}).get('book_count', 0),
+            bestseller_count=totals.get(author_id, {}).get('bestseller_count', 0),
+            rating_total=totals.get(author_id, {}).get('rating_total') or 0,
+            ratings_count=totals.get(author_id, {}).get('ratings_count') or 0,
+        )
+        for author_id in author_ids
+    ), batch_size=BATCH_SIZE)
+
+    pairs = Book.objects.using(db_alias).filter(
+        bookgenre__isnull=False, bookauthor__isnull=False,
+    ).values('bookgenre__genre', 'bookauthor__author').annotate(
+        book_count=Count('id'), rating_total=Sum('rating'),
+    ).order_by()
+    GenreAuthorStats.objects.using(db_alias).bulk_create((
+        GenreAuthorStats(
+            genre_id=row['bookgenre__genre'], author_id=row['bookauthor__author'],
+            book_count=row['book_count'], rating_total=row['rating_total'] or 0,
+        )
+        for row in pairs.iterator()
+    ), batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookstore', '0003_book_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='bookstore.author')),
+                ('book_count', models.IntegerField(default=0)),
+                ('bestseller_count', models.IntegerField(default=0)),
+                ('rating_total', models.FloatField(default=0)),
+                ('ratings_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GenreAuthorStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_count', models.IntegerField(default=0)),
+                ('rating_total', models.FloatField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genre_stats', to='bookstore.author')),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_stats', to='bookstore.genre')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['genre', '-book_count'], name='genre_author_popular_idx')],
+                'unique_together': {('genre', 'author')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop, elidable=True),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:47
+
+from django.db import migrations, models
+
+from bookstore.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently on Postgres, which cannot run in a
+    # transaction
+    atomic = False
+
+    dependencies = [
+        ('bookstore', '0004_rating_rollups'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['isbn13'], name='book_isbn13_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['type', 'id'], name='book_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['publisher', 'id'], name='book_publisher_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['rating', 'id'], name='book_rating_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['price_hardcover', 'id'], name='book_price_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['published_date', 'id'], name='book_published_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(condition=models.Q(('best_seller', True)), fields=['id'], name='book_bestseller_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(condition=models.Q(('on_offer', True)), fields=['id'], name='book_on_offer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(condition=models.Q(('rating__gte', 4.0)), fields=['rating', 'amount_ratings'], name='book_top_rated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppingorder',
+            index=models.Index(fields=['user', 'order_status'], name='order_user_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppingorder',
+            index=models.Index(fields=['order_status'], name='order_status_idx'),
+        ),
+        # Dropped once its replacement exists, so ISBN lookups stay indexed
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_isbn13_prefix_idx',
+        ),
+    ]
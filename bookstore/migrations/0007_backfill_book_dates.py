@@ -0,0 +1,94 @@
+import logging
+from datetime import datetime
+
+from django.db import migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+# Failed values listed in the error; all of them are logged
+FAILURES_SHOWN = 20
+
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%m/%d/%Y',
+    '%B %d, %Y',
+    '%b %d, %Y',
+    '%d %B %Y',
+    '%d %b %Y',
+    '%B %Y',
+    '%b %Y',
+    '%Y-%m',
+    '%Y',
+]
+
+COLUMNS = [
+    ('published_date', 'published_on'),
+    ('curated_review_date', 'curated_review_on'),
+]
+
+
+def parse_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def backfill(apps, schema_editor):
+    """
+    Parse the legacy strings into the new DateField columns in id-ordered
+    batches, each committed on its own so no lock is held for long.
+    Already-converted rows are skipped, so re-running after an
+    interruption picks up where it stopped. Unparseable values are logged
+    and fail the migration, before 0008 drops the string columns; fix or
+    clear those rows and run migrate again.
+    """
+    Book = apps.get_model('bookstore', 'Book')
+    db_alias = schema_editor.connection.alias
+    failures = []
+    for source, target in COLUMNS:
+        pending = Book.objects.using(db_alias).filter(
+            **{f'{target}__isnull': True, f'{source}__isnull': False}
+        ).exclude(**{source: ''}).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id).only('id', source)[:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            changed = []
+            for book in batch:
+                parsed = parse_date(getattr(book, source))
+                if parsed is not None:
+                    setattr(book, target, parsed)
+                    changed.append(book)
+                else:
+                    failures.append((book.id, source, getattr(book, source)))
+            with transaction.atomic(using=db_alias):
+                Book.objects.using(db_alias).bulk_update(changed, [target])
+
+    for book_id, source, value in failures:
+        logger.error('Book %s: cannot parse %s %r', book_id, source, value)
+    if failures:
+        shown = ', '.join(f'{book_id}.{source}={value!r}' for book_id, source, value in failures[:FAILURES_SHOWN])
+        raise ValueError(
+            f'{len(failures)} book date values could not be parsed ({shown}); '
+            f'correct or clear them and run migrate again'
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('bookstore', '0006_book_date_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, elidable=True),
+    ]
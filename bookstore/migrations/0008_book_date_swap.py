@@ -0,0 +1,50 @@
+from django.db import migrations
+
+COLUMNS = [
+    ('published_date', 'published_on'),
+    ('curated_review_date', 'curated_review_on'),
+]
+
+
+def check_backfilled(apps, schema_editor):
+    """Refuse to drop a string column that still holds an unconverted value"""
+    Book = apps.get_model('bookstore', 'Book')
+    for source, target in COLUMNS:
+        pending = Book.objects.using(schema_editor.connection.alias).filter(
+            **{f'{target}__isnull': True, f'{source}__isnull': False}
+        ).exclude(**{source: ''})
+        if pending.exists():
+            raise ValueError(f'{pending.count()} books have a {source} that 0007 did not convert')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookstore', '0007_backfill_book_dates'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_backfilled, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_published_order_idx',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='published_date',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='curated_review_date',
+        ),
+        migrations.RenameField(
+            model_name='book',
+            old_name='published_on',
+            new_name='published_date',
+        ),
+        migrations.RenameField(
+            model_name='book',
+            old_name='curated_review_on',
+            new_name='curated_review_date',
+        ),
+    ]
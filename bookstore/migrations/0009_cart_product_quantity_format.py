@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookstore', '0008_book_date_swap'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cartproduct',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='cartproduct',
+            name='format',
+            field=models.CharField(choices=[('hardcover', 'Hardcover'), ('paperback', 'Paperback'), ('ebook', 'eBook'), ('audiobook', 'Audiobook')], default='hardcover', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='cartproduct',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cartproduct',
+            unique_together={('cart', 'book', 'format')},
+        ),
+    ]
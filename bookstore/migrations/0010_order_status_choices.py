@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookstore', '0009_cart_product_quantity_format'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoppingorder',
+            name='order_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], default='pending', max_length=50),
+        ),
+    ]
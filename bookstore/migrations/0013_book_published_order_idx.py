@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+from bookstore.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Rebuilds the index 0008 dropped with the string column, concurrently
+    # on Postgres, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('bookstore', '0012_row_versions'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['published_date', 'id'], name='book_published_order_idx'),
+        ),
+    ]
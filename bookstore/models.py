@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class User(AbstractUser):
     phone = models.CharField(max_length=20, null=True, blank=True)
@@ -24,15 +26,38 @@ class User(AbstractUser):
         help_text='Specific permissions for this user.'
     )
 
-class Book(models.Model):
+class VersionedModel(models.Model):
+    """
+    Rows carrying a version counter and modification time, used as HTTP
+    validators (ETag / Last-Modified). `save()` bumps both; queryset
+    `.update()` calls must add `**version_bump()` themselves.
+    """
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+
+def version_bump():
+    return {'version': F('version') + 1, 'updated_at': timezone.now()}
+
+class Book(VersionedModel):
     title = models.CharField(max_length=255, unique=True)
     publisher = models.CharField(max_length=255)
-    published_date = models.CharField(max_length=50, null=True, blank=True)
+    published_date = models.DateField(null=True, blank=True)
     description = models.TextField(null=True, blank=True)
     type = models.CharField(max_length=50)
     page_count = models.IntegerField()
     curated_review = models.TextField(null=True, blank=True)
-    curated_review_date = models.CharField(max_length=50, null=True, blank=True)
+    curated_review_date = models.DateField(null=True, blank=True)
     curated_review_author = models.CharField(max_length=255, null=True, blank=True)
     isbn13 = models.CharField(max_length=13)
     cover = models.CharField(max_length=255)
@@ -54,7 +79,27 @@ class Book(models.Model):
     on_offer = models.BooleanField(default=False)
     on_display = models.BooleanField(default=True)
 
-class Author(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['isbn13'], name='book_isbn13_idx'),
+            # Filterset fields, paired with the keyset tiebreaker so a
+            # filtered page is read straight off the index in order
+            models.Index(fields=['type', 'id'], name='book_type_idx'),
+            models.Index(fields=['publisher', 'id'], name='book_publisher_idx'),
+            # Keyset ordering paths (ordering_fields + id)
+            models.Index(fields=['rating', 'id'], name='book_rating_order_idx'),
+            models.Index(fields=['price_hardcover', 'id'], name='book_price_order_idx'),
+            models.Index(fields=['published_date', 'id'], name='book_published_order_idx'),
+            # bestsellers / on_sale / top_rated touch a small slice of the table
+            models.Index(fields=['id'], name='book_bestseller_idx',
+                         condition=models.Q(best_seller=True)),
+            models.Index(fields=['id'], name='book_on_offer_idx',
+                         condition=models.Q(on_offer=True)),
+            models.Index(fields=['rating', 'amount_ratings'], name='book_top_rated_idx',
+                         condition=models.Q(rating__gte=4.0)),
+        ]
+
+class Author(VersionedModel):
     name = models.CharField(max_length=255, unique=True)
     about = models.TextField(null=True, blank=True)
     books = models.ManyToManyField(Book, through='BookAuthor')
@@ -66,7 +111,7 @@ class BookAuthor(models.Model):
     class Meta:
         unique_together = ('author', 'book')
 
-class Genre(models.Model):
+class Genre(VersionedModel):
     genre_name = models.CharField(max_length=255, unique=True)
     books = models.ManyToManyField(Book, through='BookGenre')
 
@@ -77,17 +122,63 @@ class BookGenre(models.Model):
     class Meta:
         unique_together = ('genre', 'book')
 
-class ShoppingCart(models.Model):
+class BookSimilarity(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbours')
+    similar_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbour_of')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('book', 'similar_book')
+        indexes = [
+            models.Index(fields=['book', '-score'], name='book_similarity_rank_idx'),
+        ]
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(Author, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    book_count = models.IntegerField(default=0)
+    bestseller_count = models.IntegerField(default=0)
+    rating_total = models.FloatField(default=0)
+    ratings_count = models.IntegerField(default=0)
+
+    @property
+    def average_rating(self):
+        return self.rating_total / self.book_count if self.book_count else None
+
+class GenreAuthorStats(models.Model):
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='author_stats')
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='genre_stats')
+    book_count = models.IntegerField(default=0)
+    rating_total = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('genre', 'author')
+        indexes = [
+            models.Index(fields=['genre', '-book_count'], name='genre_author_popular_idx'),
+        ]
+
+    @property
+    def average_rating(self):
+        return self.rating_total / self.book_count if self.book_count else None
+
+class ShoppingCart(VersionedModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     books = models.ManyToManyField(Book, through='CartProduct')
 
 class CartProduct(models.Model):
+    FORMAT_CHOICES = [
+        ('hardcover', 'Hardcover'),
+        ('paperback', 'Paperback'),
+        ('ebook', 'eBook'),
+        ('audiobook', 'Audiobook'),
+    ]
     cart = models.ForeignKey(ShoppingCart, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='hardcover')
+    quantity = models.PositiveIntegerField(default=1)
 
     class Meta:
-        unique_together = ('cart', 'book')
+        unique_together = ('cart', 'book', 'format')
 
 class ShippingAddress(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -104,6 +195,15 @@ class UserAddress(models.Model):
     postal_code = models.CharField(max_length=20)
 
 class ShoppingOrder(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('processing', 'Processing'),
+        ('shipped', 'Shipped'),
+        ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
+        ('refunded', 'Refunded'),
+    ]
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     user_name = models.CharField(max_length=255)
     email = models.EmailField()
@@ -113,7 +213,29 @@ class ShoppingOrder(models.Model):
     shipping_amount = models.IntegerField()
     order_amount = models.IntegerField()
     taxes_amount = models.IntegerField()
-    order_status = models.CharField(max_length=50)
+    order_status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'order_status'], name='order_user_status_idx'),
+            models.Index(fields=['order_status'], name='order_status_idx'),
+        ]
+
+class OrderDailyRollup(models.Model):
+    day = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+class OrderStatusRollup(models.Model):
+    """Orders that entered and left each status on a given day"""
+    day = models.DateField()
+    status = models.CharField(max_length=50)
+    entered = models.IntegerField(default=0)
+    exited = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'status')
 
 class OrderProduct(models.Model):
     order = models.ForeignKey(ShoppingOrder, on_delete=models.CASCADE)
@@ -0,0 +1,103 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .exceptions import InvalidOrderStatusTransition
+from .models import OrderDailyRollup, OrderStatusRollup, ShoppingOrder
+
+# status -> statuses it may move to
+ORDER_TRANSITIONS = {
+    'pending': {'paid', 'cancelled'},
+    'paid': {'processing', 'cancelled', 'refunded'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': {'refunded'},
+    'cancelled': set(),
+    'refunded': set(),
+}
+
+
+def allowed_sources(status):
+    return sorted(source for source, targets in ORDER_TRANSITIONS.items() if status in targets)
+
+def transition_orders(order_ids, status, expected=None):
+    """
+    Move orders to `status` with conditional UPDATEs, one per legal source
+    status (`WHERE id IN (...) AND order_status = <source>`), never reading
+    rows first. Orders not in a legal source status are left untouched.
+    Passing `expected` narrows this to a single UPDATE from that status.
+    Returns `{source_status: orders_moved}`.
+    """
+    if status not in ORDER_TRANSITIONS:
+        raise InvalidOrderStatusTransition(f'Unknown order status {status!r}.')
+    sources = allowed_sources(status)
+    if expected is not None:
+        if expected not in sources:
+            raise InvalidOrderStatusTransition(f'Cannot move an order from {expected!r} to {status!r}.')
+        sources = [expected]
+
+    moved = {}
+    with transaction.atomic():
+        for source in sources:
+            count = ShoppingOrder.objects.filter(
+                id__in=order_ids, order_status=source
+            ).update(order_status=status)
+            if count:
+                moved[source] = count
+        if moved:
+            transaction.on_commit(lambda: record_transitions(moved, status))
+    return moved
+
+def bump_rollup(model, lookup, **deltas):
+    """
+    Add `deltas` to the rollup row matching `lookup`, creating it on the
+    first event of the day. A concurrent insert of the same row falls back
+    to the UPDATE.
+    """
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**updates)
+
+def record_order_placed(order):
+    day = timezone.localdate(order.created_at)
+    bump_rollup(OrderDailyRollup, {'day': day}, orders=1, revenue=order.order_amount)
+    bump_rollup(OrderStatusRollup, {'day': day, 'status': order.order_status}, entered=1)
+
+def record_transitions(moved, status, day=None):
+    day = day or timezone.localdate()
+    for source, count in moved.items():
+        bump_rollup(OrderStatusRollup, {'day': day, 'status': source}, exited=count)
+    bump_rollup(OrderStatusRollup, {'day': day, 'status': status}, entered=sum(moved.values()))
+
+def rebuild_order_rollups():
+    """
+    Recompute the rollups from the order table. History of past
+    transitions is not stored, so every order counts as having entered
+    its current status on the day it was placed.
+    """
+    daily = {}
+    statuses = {}
+    orders = ShoppingOrder.objects.values_list('created_at', 'order_amount', 'order_status')
+    for created_at, amount, order_status in orders.iterator(chunk_size=2000):
+        day = timezone.localdate(created_at)
+        count, revenue = daily.get(day, (0, 0))
+        daily[day] = (count + 1, revenue + amount)
+        statuses[day, order_status] = statuses.get((day, order_status), 0) + 1
+
+    with transaction.atomic():
+        OrderDailyRollup.objects.all().delete()
+        OrderStatusRollup.objects.all().delete()
+        OrderDailyRollup.objects.bulk_create([
+            OrderDailyRollup(day=day, orders=count, revenue=revenue)
+            for day, (count, revenue) in daily.items()
+        ], batch_size=1000)
+        OrderStatusRollup.objects.bulk_create([
+            OrderStatusRollup(day=day, status=order_status, entered=count)
+            for (day, order_status), count in statuses.items()
+        ], batch_size=1000)
+    return len(daily)
@@ -0,0 +1,212 @@
+import base64
+import bisect
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a single ordering field plus a unique
+    tiebreaker. Each page is fetched with a `WHERE (field, id) > (...)`
+    style predicate instead of an OFFSET, so page 1000 costs the same as
+    page 1. Cursors are opaque base64 tokens carrying the last row's key.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    default_ordering = '-id'
+    tiebreaker = 'id'
+    rank_annotation = 'search_rank'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        The unevaluated queryset for the requested page, one row longer
+        than the page so `set_page` can tell whether another page follows.
+        Async callers evaluate it themselves and hand the rows back.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.nullable = self.is_nullable(queryset.model, self.field)
+        cursor = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.get_order_by())
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(*cursor))
+
+        return queryset[:self.page_size + 1]
+
+    def paginate_rows(self, rows, request):
+        """
+        Page through in-memory rows already sorted newest first, with the
+        same cursors the default `-id` ordering produces from a queryset
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.tiebreaker, True
+        self.model = None
+        self.nullable = False
+        cursor = self.decode_cursor(request)
+        start = 0
+        if cursor is not None:
+            last_id = cursor[1]
+            start = bisect.bisect_right(rows, -last_id, key=lambda row: -getattr(row, self.tiebreaker))
+        return self.set_page(list(rows[start:start + self.page_size + 1]))
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Returns `(field, descending)`. Only the first term of `?ordering=` is
+        honoured, and only when the view lists it in `ordering_fields`.
+        Ranked search results default to best match first.
+        """
+        default = self.default_ordering
+        if self.rank_annotation in queryset.query.annotations:
+            default = f'-{self.rank_annotation}'
+        allowed = getattr(view, 'ordering_fields', None) or []
+        requested = request.query_params.get(self.ordering_param, '')
+        term = requested.split(',')[0].strip() or default
+        if term.lstrip('-') not in allowed and term.lstrip('-') != self.tiebreaker:
+            term = default
+        return term.lstrip('-'), term.startswith('-')
+
+    @staticmethod
+    def is_nullable(model, name):
+        try:
+            return model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            return False
+
+    def get_order_by(self):
+        # NULLS LAST is only spelled out for nullable columns; on NOT NULL
+        # columns it would stop Postgres from walking a plain b-tree index
+        # backwards for descending orderings
+        nulls_last = True if self.nullable else None
+        column = F(self.field)
+        tiebreaker = F(self.tiebreaker)
+        if self.descending:
+            return [column.desc(nulls_last=nulls_last), tiebreaker.desc()]
+        return [column.asc(nulls_last=nulls_last), tiebreaker.asc()]
+
+    def get_keyset_filter(self, value, last_id):
+        """
+        Rows strictly after `(value, last_id)` in the current ordering.
+        NULLs sort last in both directions, so a NULL cursor only has
+        further NULLs after it.
+        """
+        op = 'lt' if self.descending else 'gt'
+        after_id = Q(**{f'{self.tiebreaker}__{op}': last_id})
+        if self.field == self.tiebreaker:
+            return after_id
+        if value is None:
+            return Q(**{f'{self.field}__isnull': True}) & after_id
+        after = Q(**{f'{self.field}__{op}': value}) | (Q(**{self.field: value}) & after_id)
+        if self.nullable:
+            after |= Q(**{f'{self.field}__isnull': True})
+        return after
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        token = self.encode_cursor(
+            getattr(last, self.field), getattr(last, self.tiebreaker)
+        )
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def encode_cursor(self, value, last_id):
+        payload = json.dumps(
+            [self.field, self.descending, value, last_id],
+            cls=DjangoJSONEncoder, separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        """
+        Returns `(value, last_id)`, or None for the first page. A cursor
+        minted under a different ordering is rejected rather than
+        silently producing a skewed page.
+        """
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            field, descending, value, last_id = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if field != self.field or descending != self.descending:
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return self.coerce_value(value), int(last_id)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def coerce_value(self, value):
+        """
+        The cursor's ordering value as the column's Python type, so a
+        tampered token fails here instead of in the database. Annotations
+        such as the search rank are floats.
+        """
+        if value is None:
+            if not self.nullable:
+                raise ValueError('null cursor value')
+            return None
+        if self.field == self.tiebreaker:
+            return int(value)
+        try:
+            field = self.model._meta.get_field(self.field)
+        except (AttributeError, FieldDoesNotExist):
+            return float(value)
+        return field.to_python(value)
+
+
+class BookCursorPagination(KeysetPagination):
+    page_size = 24
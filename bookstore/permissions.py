@@ -18,21 +18,21 @@ class BookFilter(filters.FilterSet):
     min_price = filters.NumberFilter(field_name="price_hardcover", lookup_expr='gte')
     max_price = filters.NumberFilter(field_name="price_hardcover", lookup_expr='lte')
     min_rating = filters.NumberFilter(field_name="rating", lookup_expr='gte')
-    genre = filters.CharFilter(field_name='BookGenre__genre__genreName')
+    genre = filters.CharFilter(field_name='genre__genre_name')
     author = filters.CharFilter(field_name='author__name')
-    published_after = filters.DateFilter(field_name='publishedDate', lookup_expr='gte')
-    published_before = filters.DateFilter(field_name='publishedDate', lookup_expr='lte')
+    published_after = filters.DateFilter(field_name='published_date', lookup_expr='gte')
+    published_before = filters.DateFilter(field_name='published_date', lookup_expr='lte')
 
     class Meta:
         model = Book
         fields = ['type', 'publisher', 'best_seller', 'on_offer', 'ebook', 'audiobook']
 
 class OrderFilter(filters.FilterSet):
-    min_amount = filters.NumberFilter(field_name="orderAmount", lookup_expr='gte')
-    max_amount = filters.NumberFilter(field_name="orderAmount", lookup_expr='lte')
-    created_after = filters.DateFilter(field_name='createdAt', lookup_expr='gte')
-    created_before = filters.DateFilter(field_name='createdAt', lookup_expr='lte')
+    min_amount = filters.NumberFilter(field_name="order_amount", lookup_expr='gte')
+    max_amount = filters.NumberFilter(field_name="order_amount", lookup_expr='lte')
+    created_after = filters.DateFilter(field_name='created_at', lookup_expr='gte')
+    created_before = filters.DateFilter(field_name='created_at', lookup_expr='lte')
 
     class Meta:
         model = ShoppingOrder
-        fields = ['orderStatus', 'shippingMethod']
\ No newline at end of file
+        fields = ['order_status', 'shipping_method']
\ No newline at end of file
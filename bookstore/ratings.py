@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Author, AuthorStats, Book, BookAuthor, BookGenre, GenreAuthorStats, version_bump
+
+HISTOGRAM_FIELDS = {
+    1: 'one_rating',
+    2: 'two_rating',
+    3: 'three_rating',
+    4: 'four_rating',
+    5: 'five_rating',
+}
+
+def submit_rating(book_id, stars):
+    """
+    Record one rating. The histogram bucket, count and weighted mean are
+    updated in a single UPDATE with F() expressions; the change in the
+    book's mean is then pushed into the author and genre rollups. The
+    catalog generation is deliberately not bumped: ratings arrive far too
+    often to flush every cached list and the snapshot each time, so they
+    show up there once the cache timeout or snapshot max age runs out.
+    """
+    with transaction.atomic():
+        old_rating, old_amount = (
+            Book.objects.select_for_update()
+            .values_list('rating', 'amount_ratings')
+            .get(pk=book_id)
+        )
+        bucket = HISTOGRAM_FIELDS[stars]
+        Book.objects.filter(pk=book_id).update(**{
+            bucket: F(bucket) + 1,
+            'amount_ratings': F('amount_ratings') + 1,
+            'rating': (F('rating') * F('amount_ratings') + stars) / (F('amount_ratings') + 1.0),
+            **version_bump(),
+        })
+        new_rating = (old_rating * old_amount + stars) / (old_amount + 1)
+        delta = new_rating - old_rating
+
+        author_ids = BookAuthor.objects.filter(book_id=book_id).values('author_id')
+        AuthorStats.objects.filter(author_id__in=author_ids).update(
+            rating_total=F('rating_total') + delta,
+            ratings_count=F('ratings_count') + 1,
+        )
+        GenreAuthorStats.objects.filter(
+            author_id__in=author_ids,
+            genre_id__in=BookGenre.objects.filter(book_id=book_id).values('genre_id'),
+        ).update(rating_total=F('rating_total') + delta)
+    return new_rating
+
+def refresh_rollups(author_ids, genre_ids=()):
+    """
+    Recompute AuthorStats for `author_ids` and GenreAuthorStats for every
+    (genre, author) pair in `genre_ids` x `author_ids` from the book rows.
+    """
+    author_ids = list(Author.objects.filter(id__in=set(author_ids)).values_list('id', flat=True))
+    genre_ids = set(genre_ids)
+    if not author_ids:
+        return
+
+    totals = {
+        row['author']: row for row in
+        Book.objects.filter(author__in=author_ids).values('author').annotate(
+            book_count=Count('id'),
+            bestseller_count=Count('id', filter=Q(best_seller=True)),
+            rating_total=Sum('rating'),
+            ratings_count=Sum('amount_ratings'),
+        )
+    }
+    author_stats = []
+    for author_id in author_ids:
+        row = totals.get(author_id, {})
+        author_stats.append(AuthorStats(
+            author_id=author_id,
+            book_count=row.get('book_count', 0),
+            bestseller_count=row.get('bestseller_count', 0),
+            rating_total=row.get('rating_total') or 0,
+            ratings_count=row.get('ratings_count') or 0,
+        ))
+    pair_stats = [
+        GenreAuthorStats(
+            genre_id=row['genre'], author_id=row['author'],
+            book_count=row['book_count'], rating_total=row['rating_total'] or 0,
+        )
+        for row in Book.objects.filter(author__in=author_ids, genre__in=genre_ids)
+        .values('genre', 'author')
+        .annotate(book_count=Count('id'), rating_total=Sum('rating'))
+    ] if genre_ids else []
+
+    with transaction.atomic():
+        AuthorStats.objects.bulk_create(
+            author_stats, update_conflicts=True, unique_fields=['author'],
+            update_fields=['book_count', 'bestseller_count', 'rating_total', 'ratings_count'],
+        )
+        if genre_ids:
+            GenreAuthorStats.objects.filter(genre_id__in=genre_ids, author_id__in=author_ids).delete()
+            GenreAuthorStats.objects.bulk_create(pair_stats)
+
+def refresh_rollups_for_books(book_ids, author_ids=(), genre_ids=()):
+    """Refresh every rollup a change to these books (or their links) touches"""
+    author_ids = set(author_ids) | set(
+        BookAuthor.objects.filter(book_id__in=book_ids).values_list('author_id', flat=True)
+    )
+    genre_ids = set(genre_ids) | set(
+        BookGenre.objects.filter(book_id__in=book_ids).values_list('genre_id', flat=True)
+    )
+    refresh_rollups(author_ids, genre_ids)
+
+def rebuild_all_rollups(batch_size=500):
+    genre_ids = list(BookGenre.objects.values_list('genre_id', flat=True).distinct())
+    author_ids = list(Author.objects.values_list('id', flat=True))
+    for start in range(0, len(author_ids), batch_size):
+        refresh_rollups(author_ids[start:start + batch_size], genre_ids)
+    return len(author_ids)
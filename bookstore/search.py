@@ -0,0 +1,131 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+FTS_TABLE = 'bookstore_book_fts'
+ISBN_PATTERN = re.compile(r'\d[\d-]{2,16}')
+
+def search_tokens(query):
+    """Word tokens safe to splice into a tsquery or an FTS5 MATCH string"""
+    return re.findall(r'\w+', query)
+
+def has_fts_table(connection):
+    return FTS_TABLE in connection.introspection.table_names()
+
+def index_book(connection, book):
+    """Upsert one book into the SQLite FTS5 table"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [book.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [book.pk, book.title, book.description or ''],
+        )
+
+def unindex_book(connection, book_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [book_id])
+
+def reindex_books(connection, book_ids, batch_size=500):
+    """Refresh just these books' rows in the SQLite FTS5 table"""
+    book_ids = list(book_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(book_ids), batch_size):
+            chunk = book_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+                f"SELECT id, title, COALESCE(description, '') FROM bookstore_book "
+                f"WHERE id IN ({placeholders})", chunk,
+            )
+
+def reindex_all(connection):
+    """Rebuild the SQLite FTS5 table, e.g. after a bulk import"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, COALESCE(description, '') FROM bookstore_book"
+        )
+
+
+class BookSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search for books. Uses the generated `search_vector`
+    column and its GIN index on Postgres, the FTS5 table on SQLite, and an
+    indexed prefix match when the query looks like an ISBN. Digit-only
+    queries that match no ISBN (a title like "1984") fall back to text
+    search. Matches are annotated with `search_rank` (higher is better),
+    which the keyset paginator orders by when no explicit ordering is
+    requested.
+    """
+    rank_annotation = 'search_rank'
+
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+
+        if ISBN_PATTERN.fullmatch(query):
+            matches = self.filter_isbn(queryset, query.replace('-', ''))
+            if matches.exists():
+                return matches
+
+        tokens = search_tokens(query)
+        if not tokens:
+            return queryset.none()
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            return self.filter_postgres(queryset, tokens)
+        if connection.vendor == 'sqlite' and has_fts_table(connection):
+            return self.filter_sqlite(queryset, tokens)
+        return super().filter_queryset(request, queryset, view)
+
+    def filter_isbn(self, queryset, isbn):
+        if len(isbn) == 13:
+            return queryset.filter(isbn13=isbn)
+        # ISBN-13s are fixed-width digit strings, so a prefix is a
+        # closed range that any b-tree index can serve under any
+        # collation, unlike LIKE 'prefix%'
+        padding = 13 - len(isbn)
+        return queryset.filter(
+            isbn13__gte=isbn + '0' * padding,
+            isbn13__lte=isbn + '9' * padding,
+        )
+
+    def filter_postgres(self, queryset, tokens):
+        table = queryset.model._meta.db_table
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        # Filtering on the bare boolean expression (not `= true`) keeps
+        # the predicate sargable for the GIN index. ts_rank is a float4;
+        # it is widened so the value round-tripped through a keyset
+        # cursor compares equal to the column it came from
+        return queryset.filter(
+            RawSQL(
+                f"{table}.search_vector @@ to_tsquery('english', %s)",
+                [tsquery], output_field=BooleanField(),
+            )
+        ).annotate(**{
+            self.rank_annotation: RawSQL(
+                f"ts_rank({table}.search_vector, to_tsquery('english', %s))::float8",
+                [tsquery], output_field=FloatField(),
+            )
+        })
+
+    def filter_sqlite(self, queryset, tokens):
+        table = queryset.model._meta.db_table
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # bm25() is lower-is-better; negate it so ranks sort like ts_rank.
+        # Title hits weigh ten times as much as description hits.
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(**{
+            self.rank_annotation: RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+                [match], output_field=FloatField(),
+            )
+        })
@@ -1,6 +1,7 @@
 # bookstore/serializers.py
 from rest_framework import serializers
 from .models import *
+from .metrics import SERIALIZER_SECONDS
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,30 +10,157 @@ class UserSerializer(serializers.ModelSerializer):
                  'role', 'is_active', 'date_joined', 'last_login')
         read_only_fields = ('date_joined', 'last_login')
 
-class BookSerializer(serializers.ModelSerializer):
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        if hasattr(self, '_data'):
+            return super().data
+        with SERIALIZER_SECONDS.labels(type(self.child).__name__).time():
+            return super().data
+
+class TimedSerializerMixin:
+    """
+    Reports the time spent building `.data` to Prometheus. Serializers
+    also used with many=True set `list_serializer_class = TimedListSerializer`.
+    """
+
+    @property
+    def data(self):
+        if hasattr(self, '_data'):
+            return super().data
+        with SERIALIZER_SECONDS.labels(type(self).__name__).time():
+            return super().data
+
+class SparseFieldsetMixin:
+    """
+    Lets clients trim the representation with `?fields=a,b` or `?omit=c`.
+    Unknown names are ignored so a stale client never gets a 400.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        # Only known names count, so `?fields=` naming nothing we have keeps every field
+        wanted = self.parse_fieldset(request, self.fields_query_param) & set(self.fields)
+        omitted = self.parse_fieldset(request, self.omit_query_param)
+        for name in list(self.fields):
+            if (wanted and name not in wanted) or name in omitted:
+                self.fields.pop(name)
+
+    @staticmethod
+    def parse_fieldset(request, param):
+        value = request.query_params.get(param, '')
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+class BookSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = '__all__'
+        read_only_fields = ('version',)
+        list_serializer_class = TimedListSerializer
 
-class AuthorSerializer(serializers.ModelSerializer):
+class BookListSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    """Compact representation for catalog grids"""
+    class Meta:
+        model = Book
+        fields = ('id', 'title', 'cover', 'type', 'rating', 'amount_ratings',
+                  'price_hardcover', 'best_seller', 'on_offer')
+        list_serializer_class = TimedListSerializer
+
+class AuthorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = '__all__'
+        read_only_fields = ('version',)
+        list_serializer_class = TimedListSerializer
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = '__all__'
+        read_only_fields = ('version',)
+        list_serializer_class = TimedListSerializer
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = '__all__'
+        read_only_fields = ('version',)
+
+BOOK_FORMATS = tuple(choice for choice, _ in CartProduct.FORMAT_CHOICES)
+
+class CartBookSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = ('id', 'title', 'cover', 'price_hardcover', 'price_paperback',
+                  'price_ebook', 'price_audiobook', 'ebook', 'audiobook', 'stock')
+
+MONEY = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+def line_price(line):
+    return getattr(line.book, f'price_{line.format}')
+
+class CartProductSerializer(serializers.ModelSerializer):
+    book = CartBookSerializer(read_only=True)
+    unit_price = serializers.SerializerMethodField()
+    line_total = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CartProduct
+        fields = ('id', 'book', 'format', 'quantity', 'unit_price', 'line_total')
+
+    def get_unit_price(self, line):
+        return MONEY.to_representation(line_price(line))
+
+    def get_line_total(self, line):
+        return MONEY.to_representation(line_price(line) * line.quantity)
+
+class ShoppingCartDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Cart with its line items and totals. Expects the lines to be prefetched
+    with their books so rendering costs no further queries.
+    """
+    items = CartProductSerializer(source='cartproduct_set', many=True, read_only=True)
+    item_count = serializers.SerializerMethodField()
+    subtotal = serializers.SerializerMethodField()
 
-class ShoppingOrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShoppingCart
+        fields = ('id', 'user', 'created_at', 'items', 'item_count', 'subtotal')
+        list_serializer_class = TimedListSerializer
+
+    def get_item_count(self, cart):
+        return sum(line.quantity for line in cart.cartproduct_set.all())
+
+    def get_subtotal(self, cart):
+        return MONEY.to_representation(
+            sum(line_price(line) * line.quantity for line in cart.cartproduct_set.all())
+        )
+
+class CartItemSerializer(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    format = serializers.ChoiceField(choices=CartProduct.FORMAT_CHOICES, default='hardcover')
+    quantity = serializers.IntegerField(min_value=1, max_value=100, default=1)
+
+class CartItemsSerializer(serializers.Serializer):
+    items = CartItemSerializer(many=True)
+
+class ShoppingOrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ShoppingOrder
         fields = '__all__'
+        # Status only changes through the update_status transitions
+        read_only_fields = ('order_status',)
+        list_serializer_class = TimedListSerializer
+
+class OrderStatusBulkSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=5000)
+    status = serializers.ChoiceField(choices=ShoppingOrder.STATUS_CHOICES)
+    expected = serializers.ChoiceField(choices=ShoppingOrder.STATUS_CHOICES, required=False)
 
 class OrderProductSerializer(serializers.ModelSerializer):
     class Meta:
@@ -44,6 +172,11 @@ class CheckoutOrderSerializer(serializers.ModelSerializer):
         model = CheckoutOrder
         fields = '__all__'
 
+class CheckoutConfirmSerializer(serializers.Serializer):
+    """Amounts the client supplies when confirming a checkout, in cents"""
+    shipping_amount = serializers.IntegerField(min_value=0, default=0)
+    taxes_amount = serializers.IntegerField(min_value=0, default=0)
+
 class NewsletterListSerializer(serializers.ModelSerializer):
     class Meta:
         model = NewsletterList
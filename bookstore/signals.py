@@ -0,0 +1,103 @@
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .cache import bump_generation
+from .models import Author, Book, BookAuthor, BookGenre, Genre, ShoppingOrder, version_bump
+from .orders import record_order_placed
+from .ratings import refresh_rollups_for_books
+from .search import has_fts_table, index_book, unindex_book
+from .similarity import rebuild_for_book
+
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_generation(sender._meta.model_name)
+
+def invalidate_catalog_links(sender, action, **kwargs):
+    # `author.books.add(...)` writes the through table without post_save
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_generation(sender._meta.model_name)
+
+def schedule_similarity_rebuild(book_ids):
+    for book_id in set(book_ids):
+        transaction.on_commit(lambda book_id=book_id: rebuild_for_book(book_id))
+
+def refresh_similarity(sender, instance, **kwargs):
+    schedule_similarity_rebuild([instance.book_id])
+
+def refresh_similarity_links(sender, instance, action, model, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        schedule_similarity_rebuild(pk_set if model is Book else [instance.pk])
+
+def refresh_book_rollups(sender, instance, **kwargs):
+    refresh_rollups_for_books([instance.pk])
+
+def refresh_link_rollups(sender, instance, **kwargs):
+    if sender is BookAuthor:
+        refresh_rollups_for_books([instance.book_id], author_ids=[instance.author_id])
+    else:
+        refresh_rollups_for_books([instance.book_id], genre_ids=[instance.genre_id])
+
+def refresh_link_rollups_m2m(sender, instance, action, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove'):
+        return
+    if model is Book:
+        # author.books.add(...) / genre.books.add(...)
+        linked = {'author_ids' if sender is BookAuthor else 'genre_ids': [instance.pk]}
+        refresh_rollups_for_books(pk_set, **linked)
+    else:
+        linked = {'author_ids' if sender is BookAuthor else 'genre_ids': pk_set}
+        refresh_rollups_for_books([instance.pk], **linked)
+
+def bump_linked_versions(sender, instance, **kwargs):
+    # Author and genre representations list their book ids
+    if sender is BookAuthor:
+        Author.objects.filter(pk=instance.author_id).update(**version_bump())
+    else:
+        Genre.objects.filter(pk=instance.genre_id).update(**version_bump())
+
+def bump_linked_versions_m2m(sender, instance, action, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    owner = Author if sender is BookAuthor else Genre
+    if model is Book:
+        owner.objects.filter(pk=instance.pk).update(**version_bump())
+    elif pk_set:
+        owner.objects.filter(pk__in=pk_set).update(**version_bump())
+
+def roll_up_new_order(sender, instance, created, **kwargs):
+    # After commit, so concurrent checkouts don't queue on the day's row lock
+    if created:
+        transaction.on_commit(lambda: record_order_placed(instance))
+
+def sync_search_index(sender, instance, using, **kwargs):
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and has_fts_table(connection):
+        index_book(connection, instance)
+
+def drop_from_search_index(sender, instance, using, **kwargs):
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and has_fts_table(connection):
+        unindex_book(connection, instance.pk)
+
+for model in (Book, Author, Genre, BookAuthor, BookGenre):
+    post_save.connect(invalidate_catalog_cache, sender=model)
+    post_delete.connect(invalidate_catalog_cache, sender=model)
+
+for through in (BookAuthor, BookGenre):
+    m2m_changed.connect(invalidate_catalog_links, sender=through)
+    post_save.connect(refresh_similarity, sender=through)
+    post_delete.connect(refresh_similarity, sender=through)
+    m2m_changed.connect(refresh_similarity_links, sender=through)
+
+post_save.connect(sync_search_index, sender=Book)
+post_delete.connect(drop_from_search_index, sender=Book)
+post_save.connect(refresh_book_rollups, sender=Book)
+
+for through in (BookAuthor, BookGenre):
+    post_save.connect(refresh_link_rollups, sender=through)
+    post_delete.connect(refresh_link_rollups, sender=through)
+    m2m_changed.connect(refresh_link_rollups_m2m, sender=through)
+    post_save.connect(bump_linked_versions, sender=through)
+    post_delete.connect(bump_linked_versions, sender=through)
+    m2m_changed.connect(bump_linked_versions_m2m, sender=through)
+
+post_save.connect(roll_up_new_order, sender=ShoppingOrder)
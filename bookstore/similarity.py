@@ -0,0 +1,127 @@
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .cache import bump_generation
+from .models import BookAuthor, BookGenre, BookSimilarity
+
+# Each shared author adds this much on top of the genre Jaccard score
+AUTHOR_BOOST = 0.5
+# Neighbours stored per book; the endpoint only shows the first few
+NEIGHBOURS_PER_BOOK = 20
+# Genres broader than this (e.g. "Fiction") still count towards overlap
+# but are not used to generate candidates, which would otherwise make a
+# rebuild quadratic in the size of the biggest genre
+GENRE_FANOUT_LIMIT = 5000
+
+
+class Memberships:
+    """In-memory book<->genre and book<->author adjacency used for scoring"""
+
+    def __init__(self, genre_rows, author_rows, genre_sizes=None):
+        self.book_genres = defaultdict(set)
+        self.genre_books = defaultdict(set)
+        self.book_authors = defaultdict(set)
+        self.author_books = defaultdict(set)
+        for book_id, genre_id in genre_rows:
+            self.book_genres[book_id].add(genre_id)
+            self.genre_books[genre_id].add(book_id)
+        for book_id, author_id in author_rows:
+            self.book_authors[book_id].add(author_id)
+            self.author_books[author_id].add(book_id)
+        self.genre_sizes = genre_sizes or {
+            genre_id: len(books) for genre_id, books in self.genre_books.items()
+        }
+
+    def neighbours(self, book_id, limit=NEIGHBOURS_PER_BOOK):
+        """Returns up to `limit` `(score, book_id)` pairs, best first"""
+        genres = self.book_genres.get(book_id, set())
+        authors = self.book_authors.get(book_id, set())
+
+        candidates = set()
+        for genre_id in genres:
+            if self.genre_sizes.get(genre_id, 0) <= GENRE_FANOUT_LIMIT:
+                candidates |= self.genre_books[genre_id]
+        for author_id in authors:
+            candidates |= self.author_books[author_id]
+        candidates.discard(book_id)
+
+        scored = []
+        for other_id in candidates:
+            other_genres = self.book_genres.get(other_id, set())
+            union = len(genres | other_genres)
+            jaccard = len(genres & other_genres) / union if union else 0.0
+            shared_authors = len(authors & self.book_authors.get(other_id, set()))
+            score = jaccard + AUTHOR_BOOST * shared_authors
+            if score > 0:
+                scored.append((score, other_id))
+        return heapq.nlargest(limit, scored)
+
+
+def load_memberships_for(book_id):
+    """Loads just the rows needed to score `book_id` against its candidates"""
+    genres = list(BookGenre.objects.filter(book_id=book_id).values_list('genre_id', flat=True))
+    authors = list(BookAuthor.objects.filter(book_id=book_id).values_list('author_id', flat=True))
+    genre_sizes = dict(
+        BookGenre.objects.filter(genre_id__in=genres)
+        .values('genre_id').annotate(size=Count('id')).values_list('genre_id', 'size')
+    )
+    narrow = [g for g in genres if genre_sizes.get(g, 0) <= GENRE_FANOUT_LIMIT]
+    candidates = set(
+        BookGenre.objects.filter(genre_id__in=narrow).values_list('book_id', flat=True)
+    ) | set(
+        BookAuthor.objects.filter(author_id__in=authors).values_list('book_id', flat=True)
+    )
+    candidates.add(book_id)
+    return Memberships(
+        BookGenre.objects.filter(book_id__in=candidates).values_list('book_id', 'genre_id'),
+        BookAuthor.objects.filter(book_id__in=candidates).values_list('book_id', 'author_id'),
+        genre_sizes=genre_sizes,
+    )
+
+
+def rebuild_for_book(book_id):
+    """
+    Recompute one book's neighbours and the mirrored rows pointing back at
+    it. Other books' lists are not re-ranked here, so they can drift
+    slightly until the next full rebuild. Rebuilds of two neighbouring
+    books can run concurrently and write the same mirrored pair, so the
+    insert upserts on the unique pair instead of failing.
+    """
+    ranked = load_memberships_for(book_id).neighbours(book_id)
+    rows = [BookSimilarity(book_id=book_id, similar_book_id=other_id, score=score)
+            for score, other_id in ranked]
+    rows += [BookSimilarity(book_id=other_id, similar_book_id=book_id, score=score)
+             for score, other_id in ranked]
+    with transaction.atomic():
+        BookSimilarity.objects.filter(Q(book_id=book_id) | Q(similar_book_id=book_id)).delete()
+        BookSimilarity.objects.bulk_create(
+            rows, update_conflicts=True,
+            unique_fields=['book', 'similar_book'], update_fields=['score'],
+        )
+    bump_generation('booksimilarity')
+
+
+def rebuild_all(batch_size=5000):
+    """Recompute the whole table from the genre and author links"""
+    memberships = Memberships(
+        BookGenre.objects.values_list('book_id', 'genre_id').iterator(chunk_size=batch_size),
+        BookAuthor.objects.values_list('book_id', 'author_id').iterator(chunk_size=batch_size),
+    )
+    book_ids = set(memberships.book_genres) | set(memberships.book_authors)
+    with transaction.atomic():
+        BookSimilarity.objects.all().delete()
+        rows = []
+        for book_id in book_ids:
+            rows.extend(
+                BookSimilarity(book_id=book_id, similar_book_id=other_id, score=score)
+                for score, other_id in memberships.neighbours(book_id)
+            )
+            if len(rows) >= batch_size:
+                BookSimilarity.objects.bulk_create(rows)
+                rows = []
+        BookSimilarity.objects.bulk_create(rows)
+    bump_generation('booksimilarity')
+    return len(book_ids)
@@ -0,0 +1,143 @@
+"""
+Optional per-worker, read-only copy of the catalog's list representation
+used to answer bestsellers, on_sale, top_rated and similar_books without a
+query. A snapshot is never mutated: when any catalog generation counter
+moves, or it is older than CATALOG_SNAPSHOT_MAX_AGE, a new one is built
+and swapped in with a single assignment, and requests already holding the
+old one finish against it. Rating writes do not move the generations, so
+ratings in a snapshot lag by at most the max age. A snapshot larger than
+CATALOG_SNAPSHOT_MAX_BYTES is discarded and the endpoints fall back to
+the database; as the old and new snapshots coexist during a rebuild, a
+worker may briefly hold twice that.
+"""
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .cache import catalog_cache_is_shared, get_generations
+from .db_routers import read_from_primary
+from .metrics import CATALOG_SNAPSHOT_BOOKS, CATALOG_SNAPSHOT_BYTES
+from .models import Book, BookSimilarity
+from .serializers import BookListSerializer
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MODELS = ('book', 'booksimilarity')
+SIMILAR_PER_BOOK = 5
+TOP_RATED_LIMIT = 10
+
+
+class BookRow:
+    """One book's BookListSerializer fields and validators; readable by the serializer as-is"""
+    __slots__ = BookListSerializer.Meta.fields + ('version', 'updated_at')
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+
+class CatalogSnapshot:
+
+    def __init__(self, generations, rows, similar):
+        self.generations = generations
+        self.built_at = time.monotonic()
+        self.books = {row.id: row for row in rows}
+        newest_first = sorted(rows, key=lambda row: row.id, reverse=True)
+        self.bestsellers = tuple(row for row in newest_first if row.best_seller)
+        self.on_sale = tuple(row for row in newest_first if row.on_offer)
+        self.top_rated = tuple(sorted(
+            (row for row in newest_first if row.rating >= 4.0 and row.amount_ratings >= 100),
+            key=lambda row: row.rating, reverse=True,
+        )[:TOP_RATED_LIMIT])
+        self.similar = {
+            book_id: tuple(self.books[other_id] for other_id in others if other_id in self.books)
+            for book_id, others in similar.items()
+        }
+
+    @classmethod
+    def build(cls):
+        # Generations are read first: a write landing mid-build leaves the
+        # snapshot labelled stale, so the next request rebuilds it. That
+        # only holds for the primary; a replica may not have the write yet
+        generations = get_generations(SNAPSHOT_MODELS)
+        with read_from_primary():
+            rows = [
+                BookRow(*values) for values in
+                Book.objects.values_list(*BookRow.__slots__).iterator(chunk_size=2000)
+            ]
+            similar = defaultdict(list)
+            # Only each book's top neighbours leave the database
+            links = BookSimilarity.objects.annotate(rank=Window(
+                RowNumber(), partition_by=F('book_id'), order_by=[F('score').desc(), F('similar_book_id')],
+            )).filter(rank__lte=SIMILAR_PER_BOOK).order_by('book_id', 'rank').values_list('book_id', 'similar_book_id')
+            for book_id, other_id in links.iterator(chunk_size=5000):
+                similar[book_id].append(other_id)
+        return cls(generations, rows, similar)
+
+    def is_current(self):
+        max_age = getattr(settings, 'CATALOG_SNAPSHOT_MAX_AGE', 60)
+        return (
+            time.monotonic() - self.built_at < max_age
+            and self.generations == get_generations(SNAPSHOT_MODELS)
+        )
+
+    def memory_bytes(self):
+        """Approximate (shared values are counted once per row) bytes held"""
+        total = sys.getsizeof(self.books) + sys.getsizeof(self.similar)
+        for row in self.books.values():
+            total += sys.getsizeof(row) + sum(sys.getsizeof(getattr(row, name)) for name in row.__slots__)
+        for listing in (self.bestsellers, self.on_sale, self.top_rated, *self.similar.values()):
+            total += sys.getsizeof(listing)
+        return total
+
+
+_snapshot = None
+_build_lock = threading.Lock()
+# monotonic time before which an over-budget snapshot is not rebuilt
+_over_budget_until = 0.0
+
+
+def get_catalog_snapshot():
+    """
+    The current snapshot, rebuilding it first if the catalog has changed
+    or it has expired. While one thread rebuilds, the others keep serving
+    the previous one. Returns None when CATALOG_SNAPSHOT_ENABLED is off or
+    the catalog cache is process-local, since other workers' writes would
+    then never reach this one's generation counters.
+    """
+    global _snapshot, _over_budget_until
+    if not getattr(settings, 'CATALOG_SNAPSHOT_ENABLED', False) or not catalog_cache_is_shared():
+        return None
+    if time.monotonic() < _over_budget_until:
+        return None
+    current = _snapshot
+    if current is not None and current.is_current():
+        return current
+    if not _build_lock.acquire(blocking=current is None):
+        return current
+    try:
+        if _snapshot is current:
+            snapshot = CatalogSnapshot.build()
+            size = snapshot.memory_bytes()
+            CATALOG_SNAPSHOT_BOOKS.set(len(snapshot.books))
+            CATALOG_SNAPSHOT_BYTES.set(size)
+            max_bytes = getattr(settings, 'CATALOG_SNAPSHOT_MAX_BYTES', 64 * 2**20)
+            if size > max_bytes:
+                logger.error(
+                    'Catalog snapshot of ~%.1f MiB exceeds CATALOG_SNAPSHOT_MAX_BYTES (%.1f MiB); '
+                    'serving from the database', size / 2**20, max_bytes / 2**20,
+                )
+                _snapshot = None
+                _over_budget_until = time.monotonic() + getattr(settings, 'CATALOG_SNAPSHOT_MAX_AGE', 60)
+                return None
+            _snapshot = snapshot
+            logger.info('Catalog snapshot rebuilt: %d books, ~%.1f MiB', len(snapshot.books), size / 2**20)
+        return _snapshot
+    finally:
+        _build_lock.release()
@@ -1,3 +1,379 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .cache import get_catalog_cache
+from .checkout import place_order
+from .exceptions import InvalidOrderStatusTransition, OutOfStockException
+from .instrumentation import query_budget
+from .models import (
+    Author, Book, BookAuthor, BookGenre, CartProduct, CheckoutOrder, Genre, OrderProduct,
+    ShoppingCart, ShoppingOrder, User,
+)
+from .orders import transition_orders
+from .ratings import submit_rating
+from .views import (
+    AuthorViewSet, BookViewSet, GenreViewSet, ShoppingCartViewSet, ShoppingOrderViewSet,
+)
+
+
+def make_book(index, **fields):
+    values = {
+        'title': f'Book {index}',
+        'publisher': f'Publisher {index % 3}',
+        'type': 'hardcover' if index % 2 else 'paperback',
+        'page_count': 300,
+        'isbn13': str(9780000000000 + index),
+        'cover': f'covers/{index}.jpg',
+        'rating': 3.0 + (index % 20) / 10,
+        'amount_ratings': index * 10,
+        'one_rating': 0,
+        'two_rating': 0,
+        'three_rating': 0,
+        'four_rating': 0,
+        'five_rating': 0,
+        'price_hardcover': Decimal('20.00') + index,
+        'price_paperback': Decimal('12.00'),
+        'price_ebook': Decimal('8.00'),
+        'price_audiobook': Decimal('15.00'),
+        'stock': 10,
+        'best_seller': index % 7 == 0,
+        'on_offer': index % 5 == 0,
+    }
+    values.update(fields)
+    return Book.objects.create(**values)
+
+
+class QueryPlanTests(TestCase):
+    """
+    The main query behind each hot endpoint must be answered from an
+    index. On Postgres sequential scans are disabled for the EXPLAIN so
+    the planner's choice on a tiny test table reflects what is possible,
+    not what is cheapest for ten rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(40):
+            make_book(index)
+        cls.user = User.objects.create_user('reader', password='secret')
+        for index in range(5):
+            ShoppingOrder.objects.create(
+                user=cls.user, user_name='Reader', email='reader@example.com',
+                address='1 Main St', phone='555', shipping_method='standard',
+                shipping_amount=0, order_amount=1000, taxes_amount=0,
+                order_status='pending',
+            )
+
+    def setUp(self):
+        get_catalog_cache().clear()
+
+    def last_query(self, viewset, action, path, table, user=None, **kwargs):
+        request = APIRequestFactory().get(path)
+        if user is not None:
+            force_authenticate(request, user)
+        with CaptureQueriesContext(connection) as queries:
+            response = viewset.as_view({'get': action})(request, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+        ]
+        self.assertTrue(selects, f'no query against {table}')
+        return selects[-1]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, sql, table):
+        plan = self.explain(sql)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {table}', plan, plan)
+        else:
+            self.assertNotRegex(plan, rf'SCAN {table}\b(?! USING)', plan)
+
+    def assertOrderedByIndex(self, sql, table):
+        self.assertUsesIndex(sql, table)
+        plan = self.explain(sql)
+        if connection.vendor == 'postgresql':
+            self.assertNotRegex(plan, r'^\s*(->\s*)?Sort\b', plan)
+        else:
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, plan)
+
+    def test_book_list_filtered_by_type(self):
+        sql = self.last_query(BookViewSet, 'list', '/books/?type=hardcover', 'bookstore_book')
+        self.assertOrderedByIndex(sql, 'bookstore_book')
+
+    def test_book_list_filtered_by_publisher(self):
+        sql = self.last_query(BookViewSet, 'list', '/books/?publisher=Publisher%201', 'bookstore_book')
+        self.assertOrderedByIndex(sql, 'bookstore_book')
+
+    def test_book_list_ordering_fields(self):
+        for ordering in ['rating', '-rating', 'price_hardcover', '-price_hardcover', 'published_date']:
+            with self.subTest(ordering=ordering):
+                sql = self.last_query(
+                    BookViewSet, 'list', f'/books/?ordering={ordering}', 'bookstore_book'
+                )
+                self.assertOrderedByIndex(sql, 'bookstore_book')
+
+    def test_bestsellers(self):
+        sql = self.last_query(BookViewSet, 'bestsellers', '/books/bestsellers/', 'bookstore_book')
+        self.assertOrderedByIndex(sql, 'bookstore_book')
+
+    def test_on_sale(self):
+        sql = self.last_query(BookViewSet, 'on_sale', '/books/on_sale/', 'bookstore_book')
+        self.assertOrderedByIndex(sql, 'bookstore_book')
+
+    def test_top_rated(self):
+        sql = self.last_query(BookViewSet, 'top_rated', '/books/top_rated/', 'bookstore_book')
+        self.assertUsesIndex(sql, 'bookstore_book')
+
+    def test_isbn_prefix_search(self):
+        sql = self.last_query(BookViewSet, 'list', '/books/?search=978000', 'bookstore_book')
+        self.assertUsesIndex(sql, 'bookstore_book')
+
+    def test_user_order_list(self):
+        sql = self.last_query(
+            ShoppingOrderViewSet, 'list', '/orders/', 'bookstore_shoppingorder', user=self.user
+        )
+        self.assertUsesIndex(sql, 'bookstore_shoppingorder')
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Each budgeted action stays within its `query_budgets` entry with
+    several related rows, so a per-row query shows up as a failure.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', password='secret')
+        cls.genre = Genre.objects.create(genre_name='Fiction')
+        cls.authors = [Author.objects.create(name=f'Author {index}') for index in range(4)]
+        cls.cart = ShoppingCart.objects.create(user=cls.user)
+        for index in range(8):
+            book = make_book(index)
+            BookGenre.objects.create(book=book, genre=cls.genre)
+            BookAuthor.objects.create(book=book, author=cls.authors[index % 4])
+            CartProduct.objects.create(cart=cls.cart, book=book, quantity=1)
+
+    def setUp(self):
+        get_catalog_cache().clear()
+
+    def assertWithinBudget(self, viewset, action, path, **kwargs):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, self.user)
+        with query_budget(viewset.query_budgets[action]):
+            response = viewset.as_view({'get': action})(request, **kwargs)
+        self.assertEqual(response.status_code, 200)
+
+    def test_catalog_actions(self):
+        author, genre = self.authors[0].pk, self.genre.pk
+        ids = ','.join(str(pk) for pk in Book.objects.values_list('pk', flat=True))
+        for viewset, action, path, kwargs in [
+            (BookViewSet, 'list', '/books/?search=Book', {}),
+            (BookViewSet, 'batch', f'/books/batch/?ids={ids}', {}),
+            (AuthorViewSet, 'list', '/authors/', {}),
+            (AuthorViewSet, 'books', f'/authors/{author}/books/', {'pk': author}),
+            (AuthorViewSet, 'statistics', f'/authors/{author}/statistics/', {'pk': author}),
+            (GenreViewSet, 'list', '/genres/', {}),
+            (GenreViewSet, 'popular_authors', f'/genres/{genre}/popular_authors/', {'pk': genre}),
+        ]:
+            with self.subTest(viewset=viewset.__name__, action=action):
+                self.assertWithinBudget(viewset, action, path, **kwargs)
+
+    def test_cart_and_order_actions(self):
+        cart = self.cart.pk
+        for viewset, action, path, kwargs in [
+            (ShoppingCartViewSet, 'list', '/shopping-carts/', {}),
+            (ShoppingCartViewSet, 'retrieve', f'/shopping-carts/{cart}/', {'pk': cart}),
+            (ShoppingCartViewSet, 'total', f'/shopping-carts/{cart}/total/', {'pk': cart}),
+            (ShoppingOrderViewSet, 'dashboard', '/orders/dashboard/', {}),
+        ]:
+            with self.subTest(viewset=viewset.__name__, action=action):
+                self.assertWithinBudget(viewset, action, path, **kwargs)
+
+
+class ConditionalRequestTests(TestCase):
+    """A matching validator short-circuits with a 304; a write changes the ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = make_book(1)
+
+    def setUp(self):
+        get_catalog_cache().clear()
+
+    def get(self, action, path, **headers):
+        request = APIRequestFactory().get(path, HTTP_ACCEPT='application/json', **headers)
+        kwargs = {'pk': self.book.pk} if action == 'retrieve' else {}
+        return BookViewSet.as_view({'get': action})(request, **kwargs)
+
+    def test_not_modified_until_written(self):
+        for action, path in [('retrieve', f'/books/{self.book.pk}/'), ('list', '/books/')]:
+            with self.subTest(action=action):
+                etag = self.get(action, path)['ETag']
+                self.assertTrue(etag.startswith('W/'))
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.get(action, path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                submit_rating(self.book.pk, 5)
+                self.assertEqual(self.get(action, path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+def make_checkout(user, items):
+    return CheckoutOrder.objects.create(
+        user=user, user_name=user.username, email=f'{user.username}@example.com',
+        address='1 Main St', phone='555', shipping_method='standard',
+        items=items, created_at=0,
+    )
+
+
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='secret')
+        cls.first = make_book(1, stock=3)
+        cls.second = make_book(2, stock=1)
+
+    def test_order_created_and_stock_taken(self):
+        checkout = make_checkout(self.user, [
+            {'book_id': self.first.id, 'quantity': 2},
+            {'book_id': self.second.id, 'quantity': 1, 'format': 'paperback'},
+            {'book_id': self.second.id, 'quantity': 5, 'format': 'ebook'},
+        ])
+        order = place_order(checkout, shipping_amount=499)
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.stock, self.second.stock), (1, 0))
+        self.assertEqual(order.order_amount, 2 * 2100 + 1200 + 5 * 800)
+        self.assertEqual(order.order_status, 'pending')
+        self.assertEqual(order.orderproduct_set.count(), 3)
+        self.assertFalse(CheckoutOrder.objects.filter(pk=checkout.pk).exists())
+
+    def test_out_of_stock_rolls_everything_back(self):
+        checkout = make_checkout(self.user, [
+            {'book_id': self.first.id, 'quantity': 1},
+            {'book_id': self.second.id, 'quantity': 2},
+        ])
+        with self.assertRaises(OutOfStockException):
+            place_order(checkout)
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 3)
+        self.assertFalse(ShoppingOrder.objects.exists())
+        self.assertTrue(CheckoutOrder.objects.filter(pk=checkout.pk).exists())
+
+    def test_unknown_book_is_a_validation_error(self):
+        checkout = make_checkout(self.user, [{'book_id': self.first.id + 1000, 'quantity': 1}])
+        with self.assertRaises(ValidationError):
+            place_order(checkout)
+        self.assertTrue(CheckoutOrder.objects.filter(pk=checkout.pk).exists())
+
+
+class OrderStatusTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='secret')
+        cls.orders = [
+            ShoppingOrder.objects.create(
+                user=cls.admin, user_name='admin', email='admin@example.com', address='1 Main St',
+                phone='555', shipping_method='standard', shipping_amount=0, order_amount=100,
+                taxes_amount=0, order_status=status,
+            )
+            for status in ('pending', 'pending', 'paid', 'shipped')
+        ]
+
+    def statuses(self):
+        return list(ShoppingOrder.objects.order_by('pk').values_list('order_status', flat=True))
+
+    def test_only_legal_sources_move(self):
+        moved = transition_orders([order.pk for order in self.orders], 'cancelled')
+        self.assertEqual(moved, {'paid': 1, 'pending': 2})
+        self.assertEqual(self.statuses(), ['cancelled', 'cancelled', 'cancelled', 'shipped'])
+
+    def test_expected_narrows_and_is_checked(self):
+        moved = transition_orders([order.pk for order in self.orders], 'cancelled', expected='paid')
+        self.assertEqual(moved, {'paid': 1})
+        with self.assertRaises(InvalidOrderStatusTransition):
+            transition_orders([self.orders[3].pk], 'cancelled', expected='shipped')
+        with self.assertRaises(InvalidOrderStatusTransition):
+            transition_orders([self.orders[0].pk], 'lost')
+
+    def bulk_update_status(self, data):
+        request = APIRequestFactory().post('/orders/bulk_update_status/', data, format='json')
+        force_authenticate(request, self.admin)
+        return ShoppingOrderViewSet.as_view({'post': 'bulk_update_status'})(request)
+
+    def test_bulk_update_status(self):
+        response = self.bulk_update_status({'ids': [self.orders[0].pk, self.orders[2].pk], 'status': 'paid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['requested'], response.data['updated']), (2, 1))
+        self.assertEqual(self.statuses(), ['paid', 'pending', 'paid', 'shipped'])
+
+    def test_bulk_update_status_rejects_bad_bodies(self):
+        for data in [
+            {'ids': '123', 'status': 'paid'},
+            {'ids': [], 'status': 'paid'},
+            {'ids': ['x'], 'status': 'paid'},
+            {'ids': [self.orders[1].pk], 'status': 'lost'},
+            {'ids': [self.orders[1].pk]},
+            [self.orders[1].pk],
+        ]:
+            with self.subTest(data=data):
+                self.assertEqual(self.bulk_update_status(data).status_code, 400)
+        self.assertEqual(self.statuses(), ['pending', 'pending', 'paid', 'shipped'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs real concurrent writers')
+class ConcurrentCheckoutLoadTests(TransactionTestCase):
+    """Hundreds of simultaneous checkouts must never sell more than the stock"""
+    stock = 50
+    buyers = 300
+
+    def setUp(self):
+        self.book = make_book(1, stock=self.stock)
+        self.popular = make_book(2, stock=self.buyers)
+        self.checkouts = [
+            make_checkout(User.objects.create_user(f'buyer{index}'), [
+                # Mixed item order exercises the deterministic lock ordering
+                {'book_id': self.popular.id, 'quantity': 1},
+                {'book_id': self.book.id, 'quantity': 1},
+            ][::1 if index % 2 else -1])
+            for index in range(self.buyers)
+        ]
+
+    def checkout(self, checkout):
+        try:
+            place_order(checkout)
+            return True
+        except OutOfStockException:
+            return False
+        finally:
+            connections.close_all()
+
+    def test_no_oversell(self):
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(self.checkout, self.checkouts))
+
+        self.book.refresh_from_db()
+        self.popular.refresh_from_db()
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(self.book.stock, 0)
+        self.assertEqual(self.popular.stock, self.buyers - self.stock)
+        self.assertEqual(ShoppingOrder.objects.count(), self.stock)
+        self.assertEqual(OrderProduct.objects.filter(book=self.book).count(), self.stock)
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import *
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -14,6 +15,12 @@ router.register(r'newsletter', NewsletterListViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    # Async catalog reads (ASGI deployments)
+    path('catalog/books/', async_views.book_list, name='catalog-book-list'),
+    path('catalog/books/bestsellers/', async_views.bestsellers, name='catalog-book-bestsellers'),
+    path('catalog/books/<int:pk>/', async_views.book_detail, name='catalog-book-detail'),
+    path('catalog/genres/<int:pk>/books/', async_views.genre_books, name='catalog-genre-books'),
+    path('catalog/authors/<int:pk>/books/', async_views.author_books, name='catalog-author-books'),
     # Authentication endpoints
     path('auth/', include('dj_rest_auth.urls')),
     path('auth/registration/', include('dj_rest_auth.registration.urls')),
@@ -1,14 +1,32 @@
-from django.shortcuts import render
+import io
 from rest_framework import viewsets, status, filters
 from .models import *
 from .serializers import *
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from django.db.models import Avg, Count, Q
+from django.db.models import Case, DecimalField, F, Prefetch, Sum, When
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django_filters.rest_framework import DjangoFilterBackend
+from .pagination import BookCursorPagination
+from .cache import cache_catalog_response
+from .search import BookSearchFilter
+from .ratings import HISTOGRAM_FIELDS, submit_rating
+from .importer import FORMATS, CatalogImporter, detect_format, read_records
+from .export import EXPORT_FORMATS, export_response
+from .bulk import parse_ids, update_books
+from .cart import upsert_cart_items
+from .checkout import place_order
+from .orders import transition_orders
+from .permissions import BookFilter, IsOwnerOrAdmin
+from .facets import facet_counts
+from .snapshot import get_catalog_snapshot
+from .fragments import FragmentJSONRenderer, fragments_apply, render_fragments
+from .conditional import ConditionalGetMixin
+from .exceptions import InvalidOrderStatusTransition
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -37,168 +55,405 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = ShoppingOrderSerializer(orders, many=True)
         return Response(serializer.data)
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['type', 'publisher', 'best_seller', 'on_offer']
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, filters.OrderingFilter]
+    filterset_class = BookFilter
     search_fields = ['title', 'description', 'isbn13']
     ordering_fields = ['rating', 'price_hardcover', 'published_date']
-    
+    pagination_class = BookCursorPagination
+    renderer_classes = [FragmentJSONRenderer, BrowsableAPIRenderer]
+    list_actions = ['list', 'bestsellers', 'on_sale', 'similar_books', 'top_rated', 'facets']
+    use_read_replica = True
+    # Search can add the FTS table check on SQLite and the ISBN lookup
+    # that falls back to text search
+    query_budgets = {
+        'list': 3, 'retrieve': 1, 'bestsellers': 1, 'on_sale': 1,
+        'similar_books': 1, 'top_rated': 1, 'facets': 3, 'batch': 1,
+    }
+    # Query parameters a snapshot-served page can honour
+    snapshot_params = {'page_size', 'cursor', 'fields', 'omit'}
+
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['retrieve', 'batch'] + self.list_actions:
             return [AllowAny()]
+        if self.action == 'rate':
+            return [IsAuthenticated()]
         return [IsAdminUser()]
 
+    def get_serializer_class(self):
+        if self.action in self.list_actions:
+            return BookListSerializer
+        return BookSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        # Narrow the SELECT to the columns the serializer will emit, plus
+        # the ordering columns the paginator needs for the next cursor and
+        # the row validators for conditional requests
+        columns = {field.name for field in Book._meta.concrete_fields}
+        emitted = [name for name in self.get_serializer().fields if name in columns]
+        return queryset.only('id', 'version', 'updated_at', *self.ordering_fields, *emitted)
+
+    def serialize_books(self, books):
+        """List representation of `books`, stitched from cached per-book fragments when possible"""
+        serializer_class = self.get_serializer_class()
+        if serializer_class is BookListSerializer and fragments_apply(self.request, serializer_class):
+            return render_fragments(books, serializer_class, self.get_serializer_context())
+        return self.get_serializer(books, many=True).data
+
+    def paginated_books(self, page):
+        """Conditional paginated response for a page of books"""
+        return self.conditional_response(
+            page, lambda: self.get_paginated_response(self.serialize_books(page)), self.paginator.has_next
+        )
+
+    def list(self, request, *args, **kwargs):
+        books = self.filter_queryset(self.get_queryset())
+        return self.paginated_books(self.paginate_queryset(books))
+
+    def get_snapshot(self):
+        """The in-process catalog snapshot, unless the request filters, searches or orders"""
+        if set(self.request.query_params) - self.snapshot_params:
+            return None
+        return get_catalog_snapshot()
+
     @action(detail=False, methods=['get'])
+    # ?genre= and ?author= filter through the link tables
+    @cache_catalog_response('book', 'genre', 'bookgenre', 'author', 'bookauthor')
     def bestsellers(self, request):
         """Get bestselling books"""
-        bestsellers = self.queryset.filter(best_seller=True)
-        serializer = self.get_serializer(bestsellers, many=True)
-        return Response(serializer.data)
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            page = self.paginator.paginate_rows(snapshot.bestsellers, request)
+        else:
+            bestsellers = self.filter_queryset(self.get_queryset().filter(best_seller=True))
+            page = self.paginate_queryset(bestsellers)
+        return self.paginated_books(page)
 
     @action(detail=False, methods=['get'])
+    # ?genre= and ?author= filter through the link tables
+    @cache_catalog_response('book', 'genre', 'bookgenre', 'author', 'bookauthor')
     def on_sale(self, request):
         """Get books currently on sale"""
-        on_sale = self.queryset.filter(on_offer=True)
-        serializer = self.get_serializer(on_sale, many=True)
-        return Response(serializer.data)
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            page = self.paginator.paginate_rows(snapshot.on_sale, request)
+        else:
+            on_sale = self.filter_queryset(self.get_queryset().filter(on_offer=True))
+            page = self.paginate_queryset(on_sale)
+        return self.paginated_books(page)
+
+    @action(detail=False, methods=['get'])
+    @cache_catalog_response('book', 'genre', 'bookgenre', 'author', 'bookauthor')
+    def facets(self, request):
+        """Get a page of filtered books plus facet counts for the whole match"""
+        books = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(books)
+        response = self.get_paginated_response(self.serialize_books(page))
+        response.data['facets'] = facet_counts(books)
+        return response
 
     @action(detail=True, methods=['get'])
     def similar_books(self, request, pk=None):
-        """Get similar books based on genres"""
-        book = self.get_object()
-        genres = book.BookGenre_set.values_list('genre', flat=True)
-        similar_books = Book.objects.filter(
-            BookGenre__genre__in=genres
-        ).exclude(id=book.id).distinct()[:5]
-        serializer = self.get_serializer(similar_books, many=True)
-        return Response(serializer.data)
+        """Get similar books ranked by shared genres and authors"""
+        if not pk.isdigit():
+            return Response({'error': 'book not found'}, status=404)
+        snapshot = get_catalog_snapshot()
+        if snapshot is not None:
+            if int(pk) not in snapshot.books:
+                return Response({'error': 'book not found'}, status=404)
+            similar_books = snapshot.similar.get(int(pk), ())
+        else:
+            similar_books = list(self.get_queryset().filter(
+                neighbour_of__book_id=pk
+            ).order_by('-neighbour_of__score')[:5])
+            # Only a book without neighbours costs the existence check
+            if not similar_books and not Book.objects.filter(pk=pk).exists():
+                return Response({'error': 'book not found'}, status=404)
+        return self.conditional_response(similar_books, lambda: Response(self.serialize_books(similar_books)))
 
     @action(detail=False, methods=['get'])
+    @cache_catalog_response('book')
     def top_rated(self, request):
         """Get top rated books"""
-        top_books = self.queryset.filter(
-            rating__gte=4.0,
-            amountRatings__gte=100
-        ).order_by('-rating')[:10]
-        serializer = self.get_serializer(top_books, many=True)
-        return Response(serializer.data)
+        snapshot = get_catalog_snapshot()
+        if snapshot is not None:
+            top_books = snapshot.top_rated
+        else:
+            top_books = list(self.get_queryset().filter(
+                rating__gte=4.0,
+                amount_ratings__gte=100
+            ).order_by('-rating')[:10])
+        return self.conditional_response(top_books, lambda: Response(self.serialize_books(top_books)))
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """Get up to 100 books by id (`?ids=3,1,2`), in the order requested"""
+        ids = parse_ids(request.query_params.get('ids'))
+        found = self.get_queryset().in_bulk(ids)
+        books = [found[book_id] for book_id in ids if book_id in found]
+        missing = [book_id for book_id in ids if book_id not in found]
+        return self.conditional_response(books, lambda: Response({
+            'results': self.get_serializer(books, many=True).data,
+            'missing': missing,
+        }), missing)
+
+    @action(detail=False, methods=['patch'], url_path='bulk')
+    def bulk_update(self, request):
+        """Apply a list of partial updates in one transaction (admin only)"""
+        books = update_books(request.data)
+        return Response(self.get_serializer(books, many=True).data)
+
+    @action(detail=True, methods=['post'])
+    def rate(self, request, pk=None):
+        """Submit a 1-5 star rating"""
+        try:
+            stars = int(request.data.get('rating'))
+        except (TypeError, ValueError):
+            stars = None
+        if stars not in HISTOGRAM_FIELDS:
+            return Response({'error': 'rating must be an integer from 1 to 5'}, status=400)
+        try:
+            rating = submit_rating(pk, stars)
+        except Book.DoesNotExist:
+            return Response({'error': 'book not found'}, status=404)
+        return Response({'status': 'rating submitted', 'rating': rating})
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        """Import a CSV or JSONL catalog feed (admin only)"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file required'}, status=400)
+        input_format = request.data.get('input_format') or detect_format(upload.name)
+        if input_format not in FORMATS:
+            return Response({'error': f'input_format must be one of {", ".join(FORMATS)}'}, status=400)
+        try:
+            batch_size = int(request.data.get('batch_size', 1000))
+        except ValueError:
+            return Response({'error': 'batch_size must be an integer'}, status=400)
+
+        importer = CatalogImporter(batch_size=max(1, min(batch_size, 5000)))
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', errors='surrogateescape', newline='')
+        stats = importer.run(read_records(stream, input_format))
+        importer.refresh_derived(incremental=True)
+        return Response({
+            'books': stats['books'],
+            'authors_created': stats['authors_created'],
+            'genres_created': stats['genres_created'],
+            'rejected': stats['rejected'],
+            'errors': stats['errors'],
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the (filtered) catalog as NDJSON or CSV (admin only)"""
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f'output must be one of {", ".join(EXPORT_FORMATS)}'}, status=400)
+        books = self.filter_queryset(Book.objects.all())
+        return export_response(request, books, export_format, 'books')
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
+    use_read_replica = True
+    query_budgets = {'list': 2, 'retrieve': 2, 'books': 2, 'statistics': 1}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'statistics':
+            return queryset.select_related('stats')
+        if self.action in ('list', 'retrieve'):
+            # The serializer lists each author's book ids
+            return queryset.prefetch_related(Prefetch('books', queryset=Book.objects.only('id')))
+        return queryset
 
     @action(detail=True, methods=['get'])
     def books(self, request, pk=None):
         """Get all books by this author"""
         author = self.get_object()
-        books = Book.objects.filter(author__author=author)
-        serializer = BookSerializer(books, many=True)
-        return Response(serializer.data)
+        books = list(Book.objects.filter(bookauthor__author=author))
+        return self.conditional_response(
+            [author, *books], lambda: Response(BookSerializer(books, many=True).data)
+        )
 
     @action(detail=True, methods=['get'])
     def statistics(self, request, pk=None):
         """Get author statistics"""
         author = self.get_object()
-        books = Book.objects.filter(author__author=author)
-        stats = {
-            'total_books': books.count(),
-            'average_rating': books.aggregate(Avg('rating'))['rating__avg'],
-            'total_ratings': books.aggregate(Count('amountRatings'))['amountRatings__count'],
-            'bestsellers': books.filter(best_seller=True).count()
-        }
-        return Response(stats)
+        stats = getattr(author, 'stats', None) or AuthorStats(author=author)
+        return Response({
+            'total_books': stats.book_count,
+            'average_rating': stats.average_rating,
+            'total_ratings': stats.ratings_count,
+            'bestsellers': stats.bestseller_count,
+        })
 
-class GenreViewSet(viewsets.ModelViewSet):
+class GenreViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
+    use_read_replica = True
+    query_budgets = {'list': 2, 'retrieve': 2, 'books': 2, 'popular_authors': 1}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return queryset.prefetch_related(Prefetch('books', queryset=Book.objects.only('id')))
+        return queryset
 
     @action(detail=True, methods=['get'])
+    @cache_catalog_response('book', 'genre', 'bookgenre')
     def books(self, request, pk=None):
         """Get all books in this genre"""
         genre = self.get_object()
-        books = Book.objects.filter(BookGenre__genre=genre)
-        serializer = BookSerializer(books, many=True)
-        return Response(serializer.data)
+        books = list(Book.objects.filter(bookgenre__genre=genre))
+        return self.conditional_response(
+            [genre, *books], lambda: Response(BookSerializer(books, many=True).data)
+        )
 
     @action(detail=True, methods=['get'])
     def popular_authors(self, request, pk=None):
         """Get popular authors in this genre"""
-        genre = self.get_object()
-        authors = Author.objects.filter(
-            book__BookGenre__genre=genre
-        ).annotate(
-            book_count=Count('book'),
-            avg_rating=Avg('book__rating')
-        ).order_by('-book_count')[:5]
+        rollups = GenreAuthorStats.objects.filter(
+            genre_id=pk
+        ).select_related('author').order_by('-book_count')[:5]
         return Response([{
-            'name': author.name,
-            'books': author.book_count,
-            'average_rating': author.avg_rating
-        } for author in authors])
+            'name': rollup.author.name,
+            'books': rollup.book_count,
+            'average_rating': rollup.average_rating
+        } for rollup in rollups])
 
-class ShoppingCartViewSet(viewsets.ModelViewSet):
+class ShoppingCartViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ShoppingCart.objects.all()
     serializer_class = ShoppingCartSerializer
     permission_classes = [IsAuthenticated]
+    query_budgets = {'list': 2, 'retrieve': 2, 'total': 2}
 
     def get_queryset(self):
-        return ShoppingCart.objects.filter(user=self.request.user)
+        queryset = ShoppingCart.objects.filter(user=self.request.user)
+        if self.action == 'retrieve':
+            lines = CartProduct.objects.select_related('book').only(
+                'cart', 'format', 'quantity', 'book__version', 'book__updated_at',
+                *[f'book__{name}' for name in CartBookSerializer.Meta.fields]
+            )
+            queryset = queryset.prefetch_related(Prefetch('cartproduct_set', queryset=lines))
+        elif self.action == 'list':
+            queryset = queryset.prefetch_related(Prefetch('books', queryset=Book.objects.only('id')))
+        return queryset
+
+    def validator_rows(self, cart):
+        # Line prices come from the books
+        return [cart, *(line.book for line in cart.cartproduct_set.all())]
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return ShoppingCartDetailSerializer
+        return ShoppingCartSerializer
 
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
-        """Add item to cart"""
+        """Add item to cart, or increase its quantity"""
         cart = self.get_object()
-        book_id = request.data.get('book_id')
-        try:
-            book = Book.objects.get(id=book_id)
-            CartProduct.objects.create(cart=cart, book=book)
-            return Response({'status': 'item added to cart'})
-        except Book.DoesNotExist:
-            return Response({'error': 'book not found'}, status=400)
+        item = CartItemSerializer(data=request.data)
+        item.is_valid(raise_exception=True)
+        line = item.validated_data
+        upsert_cart_items(cart, [(line['book_id'], line['format'], line['quantity'])])
+        return Response({'status': 'item added to cart'})
+
+    @action(detail=True, methods=['post'])
+    def add_items(self, request, pk=None):
+        """Add several items to cart in one statement"""
+        cart = self.get_object()
+        body = CartItemsSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        added = upsert_cart_items(cart, [
+            (item['book_id'], item['format'], item['quantity']) for item in body.validated_data['items']
+        ])
+        return Response({'status': 'items added to cart', 'lines': added})
 
     @action(detail=True, methods=['post'])
     def remove_item(self, request, pk=None):
         """Remove item from cart"""
         cart = self.get_object()
-        book_id = request.data.get('book_id')
-        CartProduct.objects.filter(cart=cart, book_id=book_id).delete()
+        lines = CartProduct.objects.filter(cart=cart, book_id=request.data.get('book_id'))
+        if request.data.get('format'):
+            lines = lines.filter(format=request.data['format'])
+        if lines.delete()[0]:
+            ShoppingCart.objects.filter(pk=cart.pk).update(**version_bump())
         return Response({'status': 'item removed from cart'})
 
     @action(detail=True, methods=['get'])
     def total(self, request, pk=None):
         """Calculate cart total"""
         cart = self.get_object()
-        total = sum(
-            product.book.price_hardcover 
-            for product in cart.cartProducts.all()
+        unit_price = Case(*[
+            When(format=book_format, then=F(f'book__price_{book_format}'))
+            for book_format in BOOK_FORMATS
+        ], output_field=DecimalField(max_digits=10, decimal_places=2))
+        totals = CartProduct.objects.filter(cart=cart).aggregate(
+            total=Sum(unit_price * F('quantity'),
+                      output_field=DecimalField(max_digits=12, decimal_places=2)),
+            items=Sum('quantity'),
         )
-        return Response({'total': total})
+        return Response({'total': MONEY.to_representation(totals['total'] or 0), 'items': totals['items'] or 0})
     
 class ShoppingOrderViewSet(viewsets.ModelViewSet):
     queryset = ShoppingOrder.objects.all()
     serializer_class = ShoppingOrderSerializer
     permission_classes = [IsAuthenticated]
-    filterset_fields = ['orderStatus']
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['order_status']
+    query_budgets = {'list': 1, 'retrieve': 1, 'dashboard': 3}
 
     def get_queryset(self):
         if self.request.user.is_staff:
             return ShoppingOrder.objects.all()
         return ShoppingOrder.objects.filter(user=self.request.user)
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
     def update_status(self, request, pk=None):
         """Update order status (admin only)"""
-        order = self.get_object()
         new_status = request.data.get('status')
-        if new_status:
-            order.orderStatus = new_status
-            order.save()
-            return Response({'status': 'order status updated'})
-        return Response({'error': 'no status provided'}, status=400)
+        if not new_status:
+            return Response({'error': 'no status provided'}, status=400)
+        try:
+            pk = int(pk)
+        except ValueError:
+            return Response({'error': 'order not found'}, status=404)
+        moved = transition_orders([pk], new_status, expected=request.data.get('expected'))
+        if not moved:
+            if not ShoppingOrder.objects.filter(pk=pk).exists():
+                return Response({'error': 'order not found'}, status=404)
+            raise InvalidOrderStatusTransition(f'Order cannot move to {new_status!r} from its current status.')
+        return Response({'status': 'order status updated', 'from': next(iter(moved))})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_update_status(self, request):
+        """Move many orders to a new status (admin only)"""
+        body = OrderStatusBulkSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        ids = body.validated_data['ids']
+        moved = transition_orders(ids, body.validated_data['status'], expected=body.validated_data.get('expected'))
+        return Response({
+            'requested': len(ids),
+            'updated': sum(moved.values()),
+            'from': moved,
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream order history as NDJSON or CSV"""
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f'output must be one of {", ".join(EXPORT_FORMATS)}'}, status=400)
+        return export_response(request, self.get_queryset(), export_format, 'orders')
 
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
@@ -206,22 +461,18 @@ class ShoppingOrderViewSet(viewsets.ModelViewSet):
         if not request.user.is_staff:
             return Response({'error': 'unauthorized'}, status=403)
             
-        today = timezone.now()
-        thirty_days_ago = today - timedelta(days=30)
-        
+        since = timezone.localdate() - timedelta(days=30)
+        daily = list(OrderDailyRollup.objects.filter(day__gte=since).order_by('day'))
+
         stats = {
-            'total_orders': self.queryset.count(),
-            'recent_orders': self.queryset.filter(
-                createdAt__gte=thirty_days_ago
-            ).count(),
-            'status_breakdown': self.queryset.values('orderStatus').annotate(
-                count=Count('id')
-            ),
-            'daily_orders': self.queryset.filter(
-                createdAt__gte=thirty_days_ago
-            ).extra(
-                select={'day': 'date(created_at)'}
-            ).values('day').annotate(count=Count('id')).order_by('day')
+            'total_orders': OrderDailyRollup.objects.aggregate(total=Sum('orders'))['total'] or 0,
+            'recent_orders': sum(row.orders for row in daily),
+            'status_breakdown': OrderStatusRollup.objects.values('status').annotate(
+                count=Sum(F('entered') - F('exited'))
+            ).order_by('status'),
+            'daily_orders': [
+                {'day': row.day, 'count': row.orders, 'revenue': row.revenue} for row in daily
+            ],
         }
         return Response(stats)
 
@@ -229,6 +480,15 @@ class CheckoutOrderViewSet(viewsets.ModelViewSet):
     queryset = CheckoutOrder.objects.all()
     serializer_class = CheckoutOrderSerializer
 
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnerOrAdmin])
+    def confirm(self, request, pk=None):
+        """Convert this checkout into an order, reserving stock"""
+        checkout = self.get_object()
+        amounts = CheckoutConfirmSerializer(data=request.data)
+        amounts.is_valid(raise_exception=True)
+        order = place_order(checkout, **amounts.validated_data)
+        return Response(ShoppingOrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
 class NewsletterListViewSet(viewsets.ModelViewSet):
     queryset = NewsletterList.objects.all()
     serializer_class = NewsletterListSerializer
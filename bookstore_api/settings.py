@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,21 +39,31 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_prometheus',
     'bookstore',
 ]
 
 MIDDLEWARE = [
+    'bookstore.middleware.HealthCheckMiddleware',
+    'django_prometheus.middleware.PrometheusBeforeMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'bookstore.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'bookstore.middleware.ReadReplicaMiddleware',
+    'django_prometheus.middleware.PrometheusAfterMiddleware',
 ]
 
 ROOT_URLCONF = 'bookstore_api.urls'
 
+REST_FRAMEWORK = {
+    'EXCEPTION_HANDLER': 'bookstore.exceptions.custom_exception_handler',
+}
+
 AUTH_USER_MODEL = 'bookstore.User'
 
 TEMPLATES = [
@@ -126,12 +137,97 @@ WSGI_APPLICATION = 'bookstore_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_URL (and optionally DATABASE_REPLICA_URL) select Postgres in
+# docker-compose and k8s; without it the local SQLite file is used.
+# Under sync workers connections persist for DB_CONN_MAX_AGE seconds and
+# are health-checked before reuse. Under ASGI (SERVER_MODE=asgi) each
+# request runs its queries in a fresh thread, so persistent connections
+# would pile up; they default to closing per request there. Pooling is
+# left to PgBouncer (set DB_PGBOUNCER for transaction mode), since the
+# pinned Django 4.2 / psycopg2 have no native pool.
+
+if os.environ.get('DATABASE_URL'):
+    import dj_database_url
+
+    default_conn_max_age = 0 if os.environ.get('SERVER_MODE', '').lower() == 'asgi' else 60
+
+    def database_from_url(url):
+        config = dj_database_url.parse(
+            url,
+            conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', default_conn_max_age)),
+            conn_health_checks=True,
+        )
+        # Same backends wrapped to export query counts and durations
+        config['ENGINE'] = config['ENGINE'].replace('django.db.backends.', 'django_prometheus.db.backends.')
+        if os.environ.get('DB_PGBOUNCER'):
+            config['DISABLE_SERVER_SIDE_CURSORS'] = True
+        return config
+
+    DATABASES = {'default': database_from_url(os.environ['DATABASE_URL'])}
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        DATABASES['replica'] = database_from_url(os.environ['DATABASE_REPLICA_URL'])
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+        DATABASE_ROUTERS = ['bookstore.db_routers.ReadReplicaRouter']
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django_prometheus.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Catalog invalidation (generation counters, see bookstore.cache) only
+# reaches every worker through a shared cache, so deployments with more
+# than one worker must set REDIS_URL (check bookstore.W001)
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_prometheus.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_prometheus.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# Per-book JSON fragments (bookstore.fragments) are keyed by the book's
+# version, so a write is picked up immediately; the timeout only bounds how
+# long superseded fragments occupy the cache
+CATALOG_FRAGMENT_TIMEOUT = int(os.environ.get('CATALOG_FRAGMENT_TIMEOUT', 3600))
+
+# Serve bestsellers/on_sale/top_rated/similar_books from a per-worker
+# in-memory copy of the catalog (see bookstore.snapshot); its size is
+# exported as bookstore_catalog_snapshot_bytes. It is only used with a
+# shared cache (REDIS_URL), is rebuilt at least every
+# CATALOG_SNAPSHOT_MAX_AGE seconds, and is dropped when it outgrows
+# CATALOG_SNAPSHOT_MAX_BYTES (a rebuild briefly holds two copies)
+CATALOG_SNAPSHOT_ENABLED = os.environ.get('CATALOG_SNAPSHOT_ENABLED', '') == '1'
+CATALOG_SNAPSHOT_MAX_AGE = int(os.environ.get('CATALOG_SNAPSHOT_MAX_AGE', 60))
+CATALOG_SNAPSHOT_MAX_BYTES = int(os.environ.get('CATALOG_SNAPSHOT_MAX_BYTES', 64 * 2**20))
+
+# Set when gunicorn serves /metrics on a separate port (gunicorn.conf.py);
+# the app itself then does not expose it
+METRICS_PORT = os.environ.get('METRICS_PORT')
+
+# Seconds a readiness probe result is reused before checking again
+READINESS_CHECK_INTERVAL = int(os.environ.get('READINESS_CHECK_INTERVAL', 5))
+
+# Raise instead of logging when a viewset action runs more queries than its
+# `query_budgets` entry allows
+QUERY_BUDGET_ENFORCE = os.environ.get('QUERY_BUDGET_ENFORCE', '') == '1'
 
 
 # Password validation
@@ -16,10 +16,14 @@ Including another URLconf
 """
 # from django.contrib import admin
 # from django.urls import path
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('bookstore.urls')),
-]
\ No newline at end of file
+]
+
+if not settings.METRICS_PORT:
+    urlpatterns.append(path('', include('django_prometheus.urls')))
\ No newline at end of file
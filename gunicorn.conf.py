@@ -0,0 +1,44 @@
+import os
+
+# SERVER_MODE=asgi runs uvicorn workers against the ASGI app, so the async
+# catalog views (/api/catalog/...) can hold many requests per worker;
+# anything else (the default) keeps the classic sync workers. On Django 4.2
+# the async ORM still runs each query in a thread, so ASGI is opt-in.
+server_mode = os.environ.get('SERVER_MODE', 'wsgi').lower()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# cpu_count() reports the node's cores, not the container's CPU limit, so
+# the default is a small fixed number; size it per deployment instead
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+accesslog = '-'
+
+if server_mode == 'asgi':
+    wsgi_app = 'bookstore_api.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'bookstore_api.wsgi:application'
+
+
+# With several workers each process keeps its own metrics; prometheus_client
+# aggregates them through PROMETHEUS_MULTIPROC_DIR when it is set
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+
+# METRICS_PORT serves /metrics from the master on its own port, which only
+# the ServiceMonitor reaches; the app then stops routing it (see urls.py)
+def when_ready(server):
+    port = os.environ.get('METRICS_PORT')
+    if not port or not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(int(port), registry=registry)
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)